@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+
+APP = "multiagent:app"
+BENCH_HOST = "127.0.0.1"
+BENCH_PORT = int(os.getenv("BENCH_PORT", "8100"))
+EMBED_BENCH_PORT = int(os.getenv("EMBED_BENCH_PORT", "8190"))
+READY_TIMEOUT = 600
+WORKER_COUNTS = (1, 4, 8)
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def rss_mb(pid: int) -> float:
+    # Resident set size from /proc, so this needs Linux but no extra packages.
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def worker_pids(parent: int) -> List[int]:
+    # uvicorn --workers N spawns its workers through multiprocessing; with one worker it serves in-process.
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent and b"spawn_main" in cmdline:
+            pids.append(int(entry))
+    return pids or [parent]
+
+
+class Server:
+    # A child process whose output is watched for a readiness line.
+
+    def __init__(self, args: List[str], env: Dict[str, str], ready_line: str, expected: int = 1):
+        self.started = time.perf_counter()
+        self.ready_line = ready_line
+        self.expected = expected
+        self.seen = 0
+        self.ready_at: Optional[float] = None
+        self.ready = threading.Event()
+        self.proc = subprocess.Popen(args, cwd=ROOT, env=env, stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT, text=True)
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self):
+        for line in self.proc.stdout:
+            if self.ready_line in line:
+                self.seen += 1
+                if self.seen >= self.expected and self.ready_at is None:
+                    self.ready_at = time.perf_counter() - self.started
+                    self.ready.set()
+        self.ready.set()
+
+    def wait_ready(self) -> float:
+        if not self.ready.wait(READY_TIMEOUT) or self.ready_at is None:
+            self.stop()
+            raise RuntimeError(f"{' '.join(self.proc.args)} never became ready")
+        return self.ready_at
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+def ask(port: int, n: int):
+    # Distinct questions so no cache answers them; the embedding runs even if the LLM call fails.
+    request = urllib.request.Request(
+        f"http://{BENCH_HOST}:{port}/ask",
+        data=json.dumps({"query": f"what cloud migration services do you offer for project {n}?",
+                         "session_id": f"bench-{n}"}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=120) as resp:
+            resp.read()
+    except Exception as e:
+        print("  /ask failed:", e)
+
+
+def measure(workers: int, embed_url: Optional[str], warm_requests: int) -> Dict[str, float]:
+    env = dict(os.environ, EMBED_CACHE_PATH="", LOG_LEVEL="WARNING")
+    env.pop("EMBED_SERVER_URL", None)
+    if embed_url:
+        env["EMBED_SERVER_URL"] = embed_url
+    server = Server([sys.executable, "-m", "uvicorn", APP, "--host", BENCH_HOST, "--port", str(BENCH_PORT),
+                     "--workers", str(workers)], env, "Application startup complete", expected=workers)
+    try:
+        ready = server.wait_ready()
+        pids = worker_pids(server.proc.pid)
+        idle = [rss_mb(pid) for pid in pids]
+        with ThreadPoolExecutor(max_workers=warm_requests) as pool:
+            list(pool.map(lambda n: ask(BENCH_PORT, n), range(warm_requests)))
+        warm = [rss_mb(pid) for pid in pids]
+        parent = rss_mb(server.proc.pid) if pids != [server.proc.pid] else 0.0
+    finally:
+        server.stop()
+    return {
+        "workers": workers,
+        "ready_s": ready,
+        "idle_mb": sum(idle) / len(idle),
+        "warm_mb": sum(warm) / len(warm),
+        "total_mb": sum(warm) + parent,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Start N uvicorn workers of the chat API, with and without the shared embedding server, "
+                    "and report time-to-ready and per-worker RSS. Run after python ingest.py.")
+    parser.add_argument("--workers", type=int, nargs="+", default=list(WORKER_COUNTS))
+    parser.add_argument("--warm-requests", type=int, default=0,
+                        help="/ask calls after startup so workers load their embedder (default 4 per worker)")
+    args = parser.parse_args()
+
+    rows = []
+    for workers in args.workers:
+        rows.append(("local model", measure(workers, None, args.warm_requests or 4 * workers)))
+
+    embed_server = Server([sys.executable, "embed_server.py", "--port", str(EMBED_BENCH_PORT)],
+                          dict(os.environ, LOG_LEVEL="WARNING"), "Application startup complete")
+    try:
+        embed_ready = embed_server.wait_ready()
+        embed_url = f"http://{BENCH_HOST}:{EMBED_BENCH_PORT}"
+        for workers in args.workers:
+            result = measure(workers, embed_url, args.warm_requests or 4 * workers)
+            result["total_mb"] += rss_mb(embed_server.proc.pid)
+            rows.append(("embed server", result))
+        embed_rss = rss_mb(embed_server.proc.pid)
+    finally:
+        embed_server.stop()
+
+    print(f"embed_server.py: ready in {embed_ready:.1f}s, {embed_rss:.0f} MB RSS")
+    print(f"{'embedder':13s} {'workers':>7s} {'ready s':>8s} {'idle MB/worker':>15s} "
+          f"{'warm MB/worker':>15s} {'total MB':>9s}")
+    for mode, r in rows:
+        print(f"{mode:13s} {r['workers']:7d} {r['ready_s']:8.1f} {r['idle_mb']:15.0f} "
+              f"{r['warm_mb']:15.0f} {r['total_mb']:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
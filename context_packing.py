@@ -0,0 +1,104 @@
+import os
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from token_accounting import estimate_tokens
+
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = int(os.getenv("CONTEXT_MAX_OVERLAP", "400"))
+
+
+def overlap_length(left: str, right: str, min_chars: int = MIN_OVERLAP_CHARS,
+                   max_chars: int = MAX_OVERLAP_CHARS) -> int:
+    # Longest suffix of `left` that is also a prefix of `right` (what the splitter's chunk_overlap leaves).
+    for n in range(min(len(left), len(right), max_chars), min_chars - 1, -1):
+        if left.endswith(right[:n]):
+            return n
+    return 0
+
+
+@dataclass
+class ContextBlock:
+    text: str
+    score: float
+    key: Tuple[Any, Any]
+    chunk_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class PackedContext:
+    texts: List[str] = field(default_factory=list)
+    chunk_ids: List[str] = field(default_factory=list)
+    dropped_chunk_ids: List[str] = field(default_factory=list)
+    raw_tokens: int = 0
+    packed_tokens: int = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "raw_tokens": self.raw_tokens,
+            "packed_tokens": self.packed_tokens,
+            "saved_tokens": self.raw_tokens - self.packed_tokens,
+            "blocks": len(self.texts),
+            "dropped_chunks": self.dropped_chunk_ids,
+        }
+
+
+def merge_block(a: ContextBlock, b: ContextBlock) -> Optional[ContextBlock]:
+    if a.key != b.key:
+        return None
+    if b.text in a.text or a.text in b.text:
+        text = a.text if len(a.text) >= len(b.text) else b.text
+    elif overlap_length(a.text, b.text):
+        text = a.text + b.text[overlap_length(a.text, b.text):]
+    elif overlap_length(b.text, a.text):
+        text = b.text + a.text[overlap_length(b.text, a.text):]
+    else:
+        return None
+    return ContextBlock(text, min(a.score, b.score), a.key, a.chunk_ids + b.chunk_ids)
+
+
+def merge_neighbours(blocks: List[ContextBlock]) -> List[ContextBlock]:
+    # Chunks only overlap their neighbours on the same page of the same source, so merging is
+    # attempted within that group until nothing else joins.
+    merged: List[ContextBlock] = []
+    for block in blocks:
+        changed = True
+        while changed:
+            changed = False
+            for i, other in enumerate(merged):
+                joined = merge_block(other, block)
+                if joined:
+                    block = joined
+                    del merged[i]
+                    changed = True
+                    break
+        merged.append(block)
+    return merged
+
+
+def pack_context(results: List[Tuple[Any, Optional[float]]], budget: int = CONTEXT_TOKEN_BUDGET) -> PackedContext:
+    packed = PackedContext()
+    blocks = []
+    for i, (doc, score) in enumerate(results, start=1):
+        if doc is None:
+            continue
+        packed.raw_tokens += estimate_tokens(doc.page_content)
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        blocks.append(ContextBlock(doc.page_content, math.inf if score is None else score, key,
+                                   [doc.metadata.get("chunk_id", f"chunk_{i}")]))
+
+    # Lowest distance first; a block that doesn't fit is skipped so smaller ones can still use the budget.
+    for block in sorted(merge_neighbours(blocks), key=lambda b: b.score):
+        tokens = estimate_tokens(block.text)
+        if packed.packed_tokens + tokens > budget:
+            if packed.texts:
+                packed.dropped_chunk_ids.extend(block.chunk_ids)
+                continue
+            block.text = block.text[:budget * 4]
+            tokens = estimate_tokens(block.text)
+        packed.texts.append(block.text)
+        packed.chunk_ids.extend(block.chunk_ids)
+        packed.packed_tokens += tokens
+    return packed
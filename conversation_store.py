@@ -0,0 +1,105 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Iterator, List, Tuple
+
+
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "./conversations.sqlite3")
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "500"))
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", str(7 * 86400)))
+
+
+class ConversationStore:
+    # Append-only per-session turn log plus a rolling summary checkpoint, shared through SQLite by
+    # the chat service (which writes turns and folds them in the background) and mailAPI (which
+    # drafts). Each session keeps at most max_turns turns, and idle sessions expire after ttl_seconds.
+
+    def __init__(self, path: str = CONVERSATION_DB_PATH, max_turns: int = CONVERSATION_MAX_TURNS,
+                 ttl_seconds: float = CONVERSATION_TTL):
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session TEXT NOT NULL, role TEXT NOT NULL, "
+            "text TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS turns_session ON turns (session, id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "session TEXT PRIMARY KEY, summary TEXT NOT NULL, through_id INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def append(self, session: str, role: str, text: str) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO turns (session, role, text, created_at) VALUES (?, ?, ?, ?)",
+                (session, role, text, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM turns WHERE session = ? AND id <= "
+                "(SELECT id FROM turns WHERE session = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (session, session, self.max_turns),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._expire()
+            self._conn.commit()
+            return cur.lastrowid
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        self._conn.execute(
+            "DELETE FROM turns WHERE session IN "
+            "(SELECT session FROM turns GROUP BY session HAVING MAX(created_at) < ?)",
+            (cutoff,),
+        )
+        self._conn.execute("DELETE FROM summaries WHERE updated_at < ? AND session NOT IN (SELECT session FROM turns)",
+                           (cutoff,))
+
+    def last_turn_id(self, session: str) -> int:
+        # 0 when the session has no logged turns.
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(id) FROM turns WHERE session = ?", (session,)).fetchone()
+        return row[0] or 0
+
+    def iter_turns(self, session: str, after_id: int = 0, batch: int = 100) -> Iterator[Tuple[int, str, str]]:
+        # Pages through the log by id so long sessions are never loaded in one query.
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, role, text FROM turns WHERE session = ? AND id > ? ORDER BY id LIMIT ?",
+                    (session, after_id, batch),
+                ).fetchall()
+            yield from rows
+            if len(rows) < batch:
+                return
+            after_id = rows[-1][0]
+
+    def turns_since(self, session: str, after_id: int = 0) -> List[Tuple[int, str, str]]:
+        return list(self.iter_turns(session, after_id))
+
+    def get_summary(self, session: str) -> Tuple[str, int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, through_id FROM summaries WHERE session = ?", (session,)
+            ).fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+
+    def save_summary(self, session: str, summary: str, through_id: int) -> bool:
+        # Only moves the checkpoint forward, so a slow fold can't overwrite a newer one.
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO summaries (session, summary, through_id, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(session) DO UPDATE SET summary = excluded.summary, through_id = excluded.through_id, "
+                "updated_at = excluded.updated_at WHERE excluded.through_id > summaries.through_id",
+                (session, summary, through_id, time.time()),
+            )
+            self._conn.commit()
+            return cur.rowcount > 0
@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import urllib.request
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from telemetry import get_logger, log_event
+
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./embed_cache.sqlite3")
+EMBED_CACHE_LRU_SIZE = int(os.getenv("EMBED_CACHE_LRU_SIZE", "4096"))
+EMBED_QUERY_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_QUERY_CACHE_MAX_ENTRIES", "50000"))
+EMBED_QUERY_CACHE_TTL = float(os.getenv("EMBED_QUERY_CACHE_TTL", str(7 * 86400)))
+EMBED_SERVER_URL = os.getenv("EMBED_SERVER_URL")
+
+logger = get_logger("embed_cache")
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    # Content-addressed vectors keyed by (model, sha256(text)) in SQLite. WAL mode lets several
+    # worker processes read while ingestion writes. Chunk vectors are kept for as long as ingestion
+    # needs them; query vectors live in their own table, bounded by max_queries and query_ttl.
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_queries: int = EMBED_QUERY_CACHE_MAX_ENTRIES,
+                 query_ttl: float = EMBED_QUERY_CACHE_TTL):
+        self.path = path
+        self.max_queries = max_queries
+        self.query_ttl = query_ttl
+        self._query_writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS query_embeddings_created_at ON query_embeddings (created_at)")
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(part))})",
+                    [model, *part],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items.items()],
+            )
+            self._conn.commit()
+
+    def get_query(self, model: str, text_hash: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND text_hash = ? AND created_at >= ?",
+                (model, text_hash, time.time() - self.query_ttl),
+            ).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32).tolist() if row else None
+
+    def put_query(self, model: str, text_hash: str, vector: List[float]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, text_hash, vector, created_at) VALUES (?, ?, ?, ?)",
+                (model, text_hash, np.asarray(vector, dtype=np.float32).tobytes(), time.time()),
+            )
+            self._query_writes += 1
+            if self._query_writes % 100 == 0:
+                self._prune_queries()
+            self._conn.commit()
+
+    def _prune_queries(self):
+        self._conn.execute("DELETE FROM query_embeddings WHERE created_at < ?", (time.time() - self.query_ttl,))
+        self._conn.execute(
+            "DELETE FROM query_embeddings WHERE rowid NOT IN "
+            "(SELECT rowid FROM query_embeddings ORDER BY created_at DESC LIMIT ?)",
+            (self.max_queries,),
+        )
+
+    def query_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, base: Embeddings, model_name: str, store: Optional[EmbeddingStore] = None,
+                 lru_size: int = EMBED_CACHE_LRU_SIZE):
+        self.base = base
+        self.model_name = model_name
+        self.store = store
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lru_get(self, text_hash: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._lru.get(text_hash)
+            if vector is not None:
+                self._lru.move_to_end(text_hash)
+            return vector
+
+    def _lru_put(self, text_hash: str, vector: List[float]):
+        with self._lock:
+            self._lru[text_hash] = vector
+            self._lru.move_to_end(text_hash)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_sha256(t) for t in texts]
+        vectors: Dict[str, List[float]] = {}
+        for h in hashes:
+            vector = self._lru_get(h)
+            if vector is not None:
+                vectors[h] = vector
+
+        missing = [h for h in dict.fromkeys(hashes) if h not in vectors]
+        if missing and self.store:
+            vectors.update(self.store.get_many(self.model_name, missing))
+
+        to_embed = {h: t for h, t in zip(hashes, texts) if h not in vectors}
+        self.hits += len(texts) - len(to_embed)
+        self.misses += len(to_embed)
+        if to_embed:
+            fresh = dict(zip(to_embed, self.base.embed_documents(list(to_embed.values()))))
+            if self.store:
+                self.store.put_many(self.model_name, fresh)
+            vectors.update(fresh)
+
+        for h in hashes:
+            self._lru_put(h, vectors[h])
+        return [vectors[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        text_hash = text_sha256(text)
+        vector = self._lru_get(text_hash)
+        if vector is None and self.store:
+            vector = self.store.get_query(self.model_name, text_hash)
+        if vector is None:
+            self.misses += 1
+            vector = self.base.embed_query(text)
+            if self.store:
+                self.store.put_query(self.model_name, text_hash, vector)
+        else:
+            self.hits += 1
+        self._lru_put(text_hash, vector)
+        return vector
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"lru_entries": len(self._lru), "hits": self.hits, "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0}
+
+
+class RemoteEmbeddings(Embeddings):
+    # Client for embed_server.py, so API workers don't each load torch and the model.
+
+    def __init__(self, url: str, timeout: float = 30):
+        self.url = url.rstrip("/") + "/embed"
+        self.timeout = timeout
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"texts": texts}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+            return json.loads(resp.read())["vectors"]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class LazyEmbeddings(Embeddings):
+    # Defers loading the local model until something actually needs a vector that isn't cached.
+
+    def __init__(self, model_name: str, **kwargs):
+        self.model_name = model_name
+        self.kwargs = kwargs
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Embeddings:
+        with self._lock:
+            if self._model is None:
+                from langchain_huggingface import HuggingFaceEmbeddings
+
+                log_event(logger, "embedding_model_loading", model=self.model_name)
+                self._model = HuggingFaceEmbeddings(model_name=self.model_name, **self.kwargs)
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._load().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._load().embed_query(text)
+
+
+def make_embeddings(model_name: str, cache_path: Optional[str] = EMBED_CACHE_PATH,
+                    server_url: Optional[str] = EMBED_SERVER_URL, **kwargs) -> CachedEmbeddings:
+    base = RemoteEmbeddings(server_url) if server_url else LazyEmbeddings(model_name, **kwargs)
+    store = EmbeddingStore(cache_path) if cache_path else None
+    return CachedEmbeddings(base, model_name, store)
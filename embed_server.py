@@ -0,0 +1,104 @@
+import os
+import asyncio
+import argparse
+from typing import List, Tuple
+from fastapi import FastAPI
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+
+load_dotenv()
+EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_SERVER_HOST = os.getenv("EMBED_SERVER_HOST", "127.0.0.1")
+EMBED_SERVER_PORT = int(os.getenv("EMBED_SERVER_PORT", "8090"))
+MAX_BATCH = int(os.getenv("EMBED_SERVER_MAX_BATCH", "64"))
+BATCH_WAIT_MS = float(os.getenv("EMBED_SERVER_BATCH_WAIT_MS", "5"))
+
+app = FastAPI(title="Shared Embedding Service")
+
+
+class EmbedIn(BaseModel):
+    texts: List[str]
+
+
+class MicroBatcher:
+    # Collects texts from concurrent requests for up to BATCH_WAIT_MS (or MAX_BATCH texts)
+    # and runs them through the model as one batch.
+
+    def __init__(self, embeddings, max_batch: int = MAX_BATCH, wait_ms: float = BATCH_WAIT_MS):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.wait_seconds = wait_ms / 1000
+        self.queue: "asyncio.Queue[Tuple[List[str], asyncio.Future]]" = asyncio.Queue()
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            size = len(items[0][0])
+            deadline = loop.time() + self.wait_seconds
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                size += len(item[0])
+
+            texts = [t for item_texts, _ in items for t in item_texts]
+            try:
+                vectors = await loop.run_in_executor(None, self.embeddings.embed_documents, texts)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for item_texts, future in items:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+batcher: MicroBatcher = None
+
+
+@app.on_event("startup")
+async def start_batcher():
+    global batcher
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    batcher = MicroBatcher(HuggingFaceEmbeddings(model_name=EMBED_MODEL))
+    asyncio.create_task(batcher.run())
+
+
+@app.post("/embed")
+async def embed(data: EmbedIn):
+    return {"model": EMBED_MODEL, "vectors": await batcher.embed(data.texts)}
+
+
+@app.get("/health")
+def health():
+    return {"model": EMBED_MODEL, "batches": batcher.batches, "texts": batcher.texts}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve one shared embedding model to all API processes.")
+    parser.add_argument("--host", default=EMBED_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=EMBED_SERVER_PORT)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, workers=1)
@@ -0,0 +1,125 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+
+NAME_LEXICON_PATH = os.getenv("NAME_LEXICON_PATH", "")
+
+NAME_TOKEN = r"[A-Za-z][a-zA-Z\-']{1,40}"
+EMAIL_PATTERN = r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+"
+PHONE_PATTERN = r"\+?1?\d{9,15}"
+# All of the ways a user introduces themselves, as one alternation so a message is scanned once.
+NAME_INTRO_PATTERN = r"\b(?:(?:my name is|name is|I[' ]?am|I'm|this is|myself)\s+|name\s*[:\-]\s*)"
+# Keeps "this is john.doe@x.com" from being read as the name John.
+NOT_EMAIL = r"(?![\w.+-]*@)"
+
+CONTACT_RE = re.compile(r"(\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b|(?:\+?1?\d{9,15}))")
+NAME_RE = re.compile(rf"{NAME_INTRO_PATTERN}{NOT_EMAIL}({NAME_TOKEN})\b", flags=re.IGNORECASE)
+NAME_INTRO_RE = re.compile(
+    r"^(?:(?:hi|hello|hey)[\s,!.]*)?"
+    rf"(?:my name is|name is|call me|myself|name\s*[:\-])\s*({NAME_TOKEN})"
+    r"[\s!.,]*$",
+    flags=re.IGNORECASE,
+)
+NAME_ANYWHERE_RE = re.compile(
+    rf"\b(?:my name is|name is|call me|myself|name\s*[:\-])\s*{NOT_EMAIL}({NAME_TOKEN})\b",
+    flags=re.IGNORECASE,
+)
+# One pass over a whole transcript picks up every email, phone number and introduced name.
+ENTITY_RE = re.compile(
+    rf"(?P<email>{EMAIL_PATTERN})|(?P<phone>{PHONE_PATTERN})"
+    rf"|{NAME_INTRO_PATTERN}{NOT_EMAIL}(?P<name>{NAME_TOKEN})\b",
+    flags=re.IGNORECASE,
+)
+
+COMMON_FIRST_NAMES = {
+    "aarav", "aditi", "aditya", "ahmed", "aisha", "ajay", "akash", "alex", "alice", "amanda", "amit", "amy",
+    "ana", "andrew", "anil", "anita", "anjali", "ankit", "anna", "anthony", "arjun", "arun", "ashley", "bob",
+    "brian", "carlos", "charles", "chris", "daniel", "david", "deepak", "divya", "elena", "emily", "emma",
+    "eric", "fatima", "gaurav", "george", "hannah", "harsh", "isabella", "james", "jane", "jason", "jennifer",
+    "jessica", "jing", "john", "jose", "joseph", "karan", "karthik", "kavya", "kevin", "kiran", "krishna", "laura",
+    "lisa", "lucas", "mahesh", "manish", "maria", "mark", "mary", "matthew", "meera", "michael", "ming", "mohammed",
+    "nancy", "neha", "nikhil", "nisha", "olivia", "pooja", "prakash", "priya", "rahul", "raj", "rajesh",
+    "ramesh", "ravi", "richard", "robert", "rohan", "rohit", "sachin", "sai", "sam", "sandeep", "sanjay",
+    "sarah", "sasank", "sneha", "sophia", "sri", "steven", "sunil", "suresh", "swathi", "thomas", "varun",
+    "vijay", "vikram", "william", "yash", "ying",
+}
+# Words that follow "I am" / "this is" far more often than a name does.
+NOT_NAMES = {
+    "a", "an", "about", "actually", "also", "argano", "asking", "available", "back", "busy", "calling",
+    "confused", "cool", "curious", "currently", "done", "fine", "from", "glad", "going", "good", "great",
+    "happy", "hello", "helpful", "here", "hey", "hi", "hoping", "in", "interested", "it", "just", "looking",
+    "new", "nice", "not", "ok", "okay", "on", "perfect", "planning", "ready", "really", "reaching", "so",
+    "sorry", "still", "sure", "that", "the", "there", "this", "trying", "very", "what", "wondering",
+    "working", "writing",
+}
+
+
+def _load_lexicon(path: str) -> set:
+    names = set(COMMON_FIRST_NAMES)
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            names.update(line.strip().lower() for line in f if line.strip())
+    return names
+
+
+NAME_LEXICON = _load_lexicon(NAME_LEXICON_PATH)
+
+
+@dataclass
+class Entities:
+    emails: List[str] = field(default_factory=list)
+    phones: List[str] = field(default_factory=list)
+    names: List[str] = field(default_factory=list)
+
+
+def _append_unique(items: List[str], value: str):
+    if value not in items:
+        items.append(value)
+
+
+def name_candidates(text: str) -> List[str]:
+    # Introduced names in the order they appear, capitalised and without duplicates.
+    names: List[str] = []
+    if text:
+        for m in NAME_RE.finditer(text):
+            _append_unique(names, m.group(1).capitalize())
+    return names
+
+
+def classify_name(name: str) -> Optional[bool]:
+    # True/False when the local lexicon is sure, None when only the LLM can tell.
+    lowered = name.lower()
+    if lowered in NOT_NAMES:
+        return False
+    if lowered in NAME_LEXICON:
+        return True
+    return None
+
+
+def stated_name(text: str) -> Optional[str]:
+    # A name given with an explicit introduction ("my name is", "call me", "name:"), unless the
+    # lexicon knows the word isn't a name.
+    for m in NAME_ANYWHERE_RE.finditer(text or ""):
+        name = m.group(1).capitalize()
+        if classify_name(name) is not False:
+            return name
+    return None
+
+
+def find_contact(text: str) -> Optional[str]:
+    m = CONTACT_RE.search(text or "")
+    return m.group(0) if m else None
+
+
+def scan_transcript(texts: Iterable[Optional[str]]) -> Entities:
+    entities = Entities()
+    for m in ENTITY_RE.finditer("\n".join(t for t in texts if t)):
+        if m.group("email"):
+            _append_unique(entities.emails, m.group("email").rstrip("."))
+        elif m.group("phone"):
+            _append_unique(entities.phones, m.group("phone"))
+        else:
+            _append_unique(entities.names, m.group("name").capitalize())
+    return entities
@@ -0,0 +1,206 @@
+import os
+import json
+import shutil
+import hashlib
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dotenv import load_dotenv
+from typing import Any, Dict, Iterator, List, Tuple
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import Chroma
+from embed_cache import make_embeddings
+from lexical import LexicalIndex
+from retrieval import VECTORS_FILE, apply_search_ef, export_vectors, hnsw_metadata
+from semantic_cache import write_index_version
+
+
+load_dotenv()
+PDF_DIR = "./sample_files"
+PERSIST_DIR = "./db"
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+MANIFEST_FILE = "ingest_manifest.json"
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 2)))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_sha256(source: str, text: str) -> str:
+    return hashlib.sha256(f"{source}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+def load_manifest(persist_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(persist_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"sources": {}}
+
+
+def save_manifest(persist_dir: str, manifest: Dict[str, Any]):
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def load_pdf(pdf_dir: str, fname: str) -> List:
+    loader = PyPDFLoader(os.path.join(pdf_dir, fname))
+    pages = loader.load()
+    for p in pages:
+        p.metadata["source"] = fname
+    return pages
+
+
+def split_source(pages: List, fname: str, text_splitter) -> List:
+    # Chunk IDs are derived from the source name and chunk text, so they stay stable across runs
+    # and only change when the chunk itself changes.
+    docs = text_splitter.split_documents(pages)
+    seen: Dict[str, int] = {}
+    for d in docs:
+        digest = chunk_sha256(fname, d.page_content)
+        n = seen.get(digest, 0)
+        seen[digest] = n + 1
+        d.metadata["chunk_hash"] = digest
+        d.metadata["chunk_id"] = f"chunk_{digest[:16]}" + (f"_{n}" if n else "")
+    return docs
+
+
+def parse_source(pdf_dir: str, fname: str) -> Tuple[str, str, List]:
+    # Runs in a worker process: hash, parse and split one PDF so pages never leave the worker.
+    file_hash = file_sha256(os.path.join(pdf_dir, fname))
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return fname, file_hash, split_source(load_pdf(pdf_dir, fname), fname, text_splitter)
+
+
+def iter_parsed_sources(pdf_dir: str, fnames: List[str], workers: int) -> Iterator[Tuple[str, str, List]]:
+    # Keeps at most 2 * workers files in flight so memory stays bounded on large corpora.
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque(fnames)
+        in_flight = set()
+        while pending or in_flight:
+            while pending and len(in_flight) < workers * 2:
+                in_flight.add(pool.submit(parse_source, pdf_dir, pending.popleft()))
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    yield future.result()
+                except Exception as e:
+                    print("Error parsing PDF:", e)
+
+
+def build_index(pdf_dir: str = PDF_DIR, persist_dir: str = PERSIST_DIR, rebuild: bool = False,
+                workers: int = INGEST_WORKERS, batch_size: int = EMBED_BATCH_SIZE):
+    manifest = load_manifest(persist_dir)
+    if os.path.exists(persist_dir) and (rebuild or not manifest["sources"]):
+        # Stores built before the manifest existed have no stable chunk IDs to diff against.
+        print(f"Removing existing Chroma DB at {persist_dir}...")
+        shutil.rmtree(persist_dir)
+        manifest = {"sources": {}}
+
+    embeddings = make_embeddings(EMBED_MODEL, encode_kwargs={"batch_size": batch_size})
+    db = Chroma(persist_directory=persist_dir, embedding_function=embeddings, collection_metadata=hnsw_metadata())
+    apply_search_ef(db)
+
+    sources: Dict[str, Any] = manifest["sources"]
+    lexical_missing = not LexicalIndex.exists(persist_dir)
+    lexical = LexicalIndex.load(persist_dir)
+    if lexical_missing and sources:
+        # Store built before the lexical index existed: seed it from the chunks Chroma already has.
+        existing = db.get(include=["documents", "metadatas"])
+        for chunk_id, text, meta in zip(existing["ids"], existing["documents"], existing["metadatas"]):
+            lexical.add(chunk_id, text or "", meta or {})
+    current = sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf"))
+    added = deleted = skipped = 0
+    started = time.perf_counter()
+    embed_seconds = 0.0
+
+    for fname in sorted(set(sources) - set(current)):
+        stale_ids = list(sources.pop(fname)["chunks"])
+        if stale_ids:
+            db.delete(ids=stale_ids)
+            lexical.remove(stale_ids)
+        deleted += len(stale_ids)
+        print(f"Removed {fname} ({len(stale_ids)} chunks)")
+
+    changed = []
+    for fname in current:
+        previous = sources.get(fname)
+        if previous and previous["sha256"] == file_sha256(os.path.join(pdf_dir, fname)):
+            skipped += 1
+        else:
+            changed.append(fname)
+
+    batch: List = []
+
+    def flush():
+        nonlocal embed_seconds
+        if not batch:
+            return
+        t0 = time.perf_counter()
+        ids = [d.metadata["chunk_id"] for d in batch]
+        db.add_documents(batch, ids=ids)
+        lexical.add_documents(batch, ids)
+        embed_seconds += time.perf_counter() - t0
+        batch.clear()
+
+    for fname, file_hash, docs in iter_parsed_sources(pdf_dir, changed, workers):
+        new_chunks = {d.metadata["chunk_id"]: d.metadata["chunk_hash"] for d in docs}
+        previous = sources.get(fname)
+        old_chunks = previous["chunks"] if previous else {}
+
+        stale_ids = [cid for cid in old_chunks if cid not in new_chunks]
+        if stale_ids:
+            db.delete(ids=stale_ids)
+            lexical.remove(stale_ids)
+        fresh = [d for d in docs if d.metadata["chunk_id"] not in old_chunks]
+        for d in fresh:
+            batch.append(d)
+            if len(batch) >= batch_size:
+                flush()
+        added += len(fresh)
+        deleted += len(stale_ids)
+        sources[fname] = {"sha256": file_hash, "chunks": new_chunks}
+        print(f"Parsed {fname}: +{len(fresh)} / -{len(stale_ids)} chunks")
+    flush()
+
+    if added or deleted:
+        db.persist()
+    if added or deleted or not os.path.exists(os.path.join(persist_dir, VECTORS_FILE)):
+        export_vectors(db, persist_dir)
+    if added or deleted or lexical_missing:
+        lexical.save(persist_dir)
+    if added or deleted:
+        # Bumped last: running workers reload their retriever and drop cached answers on this.
+        write_index_version(persist_dir)
+    save_manifest(persist_dir, manifest)
+
+    elapsed = time.perf_counter() - started
+    print(f"Done: {added} chunks added, {deleted} removed, {skipped} files unchanged")
+    if added:
+        print(f"Throughput: {added / elapsed:.1f} chunks/sec overall, "
+              f"{added / embed_seconds if embed_seconds else 0:.1f} chunks/sec embed+write "
+              f"({elapsed:.1f}s total, {workers} parse workers, batch size {batch_size})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally build the Chroma knowledge base from the company PDFs.")
+    parser.add_argument("--pdf-dir", default=PDF_DIR)
+    parser.add_argument("--persist-dir", default=PERSIST_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="delete and rebuild the whole store")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="PDF parsing processes")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="chunks per embedding/write batch")
+    args = parser.parse_args()
+    build_index(args.pdf_dir, args.persist_dir, args.rebuild, args.workers, args.batch_size)
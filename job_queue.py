@@ -0,0 +1,113 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from telemetry import get_logger, log_event
+
+
+JOB_MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", "4"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "120"))
+
+logger = get_logger("job_queue")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    __slots__ = ("job_id", "key", "status", "result", "error", "created_at", "finished_at", "done")
+
+    def __init__(self, key: Optional[str]):
+        self.job_id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {"job_id": self.job_id, "status": self.status}
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    # In-process job runner on the event loop: at most max_concurrency jobs run at once, at most
+    # max_pending wait, and submitting a key that is already queued, running or recently finished
+    # returns the existing job instead of doing the work again.
+
+    def __init__(self, max_concurrency: int = JOB_MAX_CONCURRENCY, max_pending: int = JOB_MAX_PENDING,
+                 result_ttl: float = JOB_RESULT_TTL, timeout: float = JOB_TIMEOUT):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_key: Dict[str, str] = {}
+        self._tasks = set()
+        self.deduplicated = 0
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if job.finished_at is None or job.finished_at >= cutoff:
+                break
+            self._jobs.popitem(last=False)
+            if job.key and self._by_key.get(job.key) == job.job_id:
+                del self._by_key[job.key]
+
+    def submit(self, fn: Callable[[], Awaitable[Any]], key: Optional[str] = None) -> Job:
+        self._expire()
+        if key and key in self._by_key:
+            job = self._jobs.get(self._by_key[key])
+            if job is not None and job.status != "failed":
+                self.deduplicated += 1
+                return job
+        if sum(1 for j in self._jobs.values() if j.status == "queued") >= self.max_pending:
+            raise QueueFull("Too many pending jobs")
+
+        job = Job(key)
+        self._jobs[job.job_id] = job
+        if key:
+            self._by_key[key] = job.job_id
+        task = asyncio.get_running_loop().create_task(self._run(job, fn))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: Job, fn: Callable[[], Awaitable[Any]]):
+        async with self._slots:
+            job.status = "running"
+            try:
+                job.result = await asyncio.wait_for(fn(), self.timeout)
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e) or type(e).__name__
+                job.status = "failed"
+                log_event(logger, "job_failed", logging.ERROR, job_id=job.job_id, error=str(e))
+            finally:
+                job.finished_at = time.time()
+                # Finished jobs move to the end so expiry can stop at the first unexpired one.
+                self._jobs.move_to_end(job.job_id)
+                job.done.set()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"jobs": counts, "deduplicated": self.deduplicated}
@@ -0,0 +1,101 @@
+import os
+import re
+import json
+import math
+import heapq
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+LEXICAL_INDEX_FILE = "lexical_index.json"
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.+#&][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or our the "
+    "this to us we what when where which who why with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    # BM25 inverted index over the same chunk IDs as the Chroma store. Only chunk text and
+    # metadata are persisted; postings are rebuilt on load, which is cheap at this corpus size.
+
+    def __init__(self):
+        self.chunks: Dict[str, Dict[str, Any]] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def add(self, chunk_id: str, text: str, metadata: Optional[Dict[str, Any]] = None):
+        if chunk_id in self.chunks:
+            self.remove([chunk_id])
+        terms = tokenize(text)
+        self.chunks[chunk_id] = {"text": text, "metadata": metadata or {}}
+        self.lengths[chunk_id] = len(terms)
+        self.total_length += len(terms)
+        for term, tf in Counter(terms).items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+
+    def add_documents(self, docs: Iterable, ids: List[str]):
+        for d, chunk_id in zip(docs, ids):
+            self.add(chunk_id, d.page_content, d.metadata)
+
+    def remove(self, ids: Iterable[str]):
+        for chunk_id in ids:
+            chunk = self.chunks.pop(chunk_id, None)
+            if chunk is None:
+                continue
+            self.total_length -= self.lengths.pop(chunk_id)
+            for term in set(tokenize(chunk["text"])):
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(chunk_id, None)
+                    if not posting:
+                        del self.postings[term]
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        n = len(self.chunks)
+        if not n:
+            return []
+        avg_length = self.total_length / n or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, tf in posting.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save(self, persist_dir: str):
+        path = os.path.join(persist_dir, LEXICAL_INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.chunks, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "LexicalIndex":
+        index = cls()
+        try:
+            with open(os.path.join(persist_dir, LEXICAL_INDEX_FILE)) as f:
+                chunks = json.load(f)
+        except (OSError, ValueError):
+            return index
+        for chunk_id, chunk in chunks.items():
+            index.add(chunk_id, chunk["text"], chunk["metadata"])
+        return index
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, LEXICAL_INDEX_FILE))
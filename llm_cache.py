@@ -0,0 +1,115 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from token_accounting import account
+
+
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+
+
+class CachingLLM:
+    # Exact-match memoization around invoke/ainvoke (LangChain) and complete/acomplete (LlamaIndex).
+    # Every other attribute is passed through to the wrapped model. Pass cache=False to opt out per call.
+    # With a ledger, every call that actually reaches the model is recorded; cache hits cost nothing.
+
+    def __init__(self, llm, model: Optional[str] = None, temperature: Optional[float] = None,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_seconds: float = LLM_CACHE_TTL, ledger=None):
+        self.llm = llm
+        self.ledger = ledger
+        self.model = model or getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+        self.temperature = temperature if temperature is not None else getattr(llm, "temperature", None)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def __getattr__(self, name):
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    def _key(self, method: str, prompt: Any) -> str:
+        raw = f"{self.model}\x1f{self.temperature}\x1f{method}\x1f{prompt}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _get(self, key: str):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _put(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _record(self, prompt, value):
+        if self.ledger is not None:
+            self.ledger.record(account(value, prompt))
+        return value
+
+    def _call(self, method: str, prompt, cache: bool, *args, **kwargs):
+        if not cache or args or kwargs:
+            self.bypassed += 1
+            return self._record(prompt, getattr(self.llm, method)(prompt, *args, **kwargs))
+        key = self._key(method, prompt)
+        value = self._get(key)
+        if value is None:
+            value = self._record(prompt, getattr(self.llm, method)(prompt))
+            self._put(key, value)
+        return value
+
+    async def _acall(self, method: str, prompt, cache: bool, *args, **kwargs):
+        if not cache or args or kwargs:
+            self.bypassed += 1
+            return self._record(prompt, await getattr(self.llm, method)(prompt, *args, **kwargs))
+        key = self._key(method, prompt)
+        value = self._get(key)
+        if value is None:
+            value = self._record(prompt, await getattr(self.llm, method)(prompt))
+            self._put(key, value)
+        return value
+
+    def invoke(self, prompt, *args, cache: bool = True, **kwargs):
+        return self._call("invoke", prompt, cache, *args, **kwargs)
+
+    async def ainvoke(self, prompt, *args, cache: bool = True, **kwargs):
+        return await self._acall("ainvoke", prompt, cache, *args, **kwargs)
+
+    def complete(self, prompt, *args, cache: bool = True, **kwargs):
+        return self._call("complete", prompt, cache, *args, **kwargs)
+
+    async def acomplete(self, prompt, *args, cache: bool = True, **kwargs):
+        return await self._acall("acomplete", prompt, cache, *args, **kwargs)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
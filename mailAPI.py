@@ -1,20 +1,28 @@
 import os
-import re
+import json
+import asyncio
+import hashlib
 from dotenv import load_dotenv
 from llama_index.core import Settings
 from llama_index.llms.google_genai import GoogleGenAI
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
-import google.generativeai as genai
+from llm_cache import CachingLLM
+from extraction import scan_transcript
+from token_accounting import account, ledger, set_token_labels, token_scope
+from telemetry import Telemetry
+from conversation_store import ConversationStore
+from rolling_summary import RollingSummarizer, format_turns
+from job_queue import JobQueue, QueueFull
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
 
 app = FastAPI()
+telemetry = Telemetry("mailAPI", ledger=ledger)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,61 +40,45 @@ class ChatRequest(BaseModel):
 Settings.llm = GoogleGenAI(
     model="gemini-2.5-flash",
     temperature=0.2,
+    api_key=GOOGLE_API_KEY,
 )
+llm = CachingLLM(Settings.llm, model="gemini-2.5-flash", temperature=0.2, ledger=ledger)
 
-Settings.embed_model = HuggingFaceEmbedding(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
+# The draft pipeline only calls the LLM; disable embeddings so this process never loads torch.
+Settings.embed_model = None
+
+
+async def complete_summary(prompt):
+    with telemetry.stage("summary"), token_scope(agent="summary"):
+        resp = await llm.acomplete(prompt, cache=False)
+    return resp.text
+
+conversations = ConversationStore()
+summarizer = RollingSummarizer(conversations, complete_summary)
+draft_jobs = JobQueue()
 
 
-def summarize_conversation(convo_text):
+async def summarize_conversation(convo_text):
     prompt = (
         "Summarize the following chat conversation in 4–5 clear sentences. "
         "If any email is mentioned, include it.\n\n"
         f"{convo_text}\n"
     )
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        
-
-        token_count_response = model.count_tokens(prompt)
-        prompt_tokens = token_count_response.total_tokens
-        
-        resp = Settings.llm.complete(prompt)
+        with telemetry.stage("summary"), token_scope(agent="summary"):
+            resp = await llm.acomplete(prompt)
         summary_text = resp.text.strip()
-        
 
-        completion_tokens = len(summary_text.split()) * 1
-        total_tokens = prompt_tokens + completion_tokens
-        
-        print("\n===== Summarization Token Usage =====")
-        print(f"Prompt Tokens: {prompt_tokens}")
-        print(f"Completion Tokens: {completion_tokens}")
-        print(f"Total Tokens: {total_tokens}\n")
+        usage = account(resp, prompt, summary_text)
+        telemetry.event("token_usage", agent="summary", exact=usage.exact, prompt_tokens=usage.prompt_tokens,
+                        completion_tokens=usage.completion_tokens, total_tokens=usage.total_tokens)
         
         return summary_text
     except Exception as e:
-        print("Error during summarization:", repr(e))
+        telemetry.error("summary_failed", error=repr(e))
         return None
 
-def extract_email(text):
-    if not text:
-        return []
-
-    email_pattern = r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+"
-    found = re.findall(email_pattern, text)
-
-    unique_emails = []
-    seen = set()
-    for email in found:
-        email_clean = email.rstrip(".") 
-        if email_clean not in seen:
-            unique_emails.append(email_clean)
-            seen.add(email_clean)
-
-    return unique_emails
-
-def detect_topics_llm(convo_text):
+async def detect_topics_llm(convo_text):
     prompt = (
         "Identify the main topics discussed in this conversation. "
         "Return ONLY a comma-separated list of short topic labels."
@@ -95,7 +87,8 @@ def detect_topics_llm(convo_text):
     )
 
     try:
-        resp = Settings.llm.complete(prompt)
+        with telemetry.stage("topics"), token_scope(agent="topics"):
+            resp = await llm.acomplete(prompt)
         topics_text = resp.text.strip()
 
         topics = [t.strip() for t in topics_text.split(",") if t.strip()]
@@ -105,7 +98,7 @@ def detect_topics_llm(convo_text):
         return topics
 
     except Exception as e:
-        print("Topic detection error:", repr(e))
+        telemetry.error("topics_failed", error=repr(e))
         return ["General Inquiry"]
 
 
@@ -142,40 +135,117 @@ AI Support Bot
 """
     return email_text.strip()
 
-def run(conversation_text, user_name=None, user_contact=None):
-    summary = summarize_conversation(conversation_text)
+async def run(conversation_text, user_name=None, user_contact=None):
+    # Summary and topics both only need the transcript, so the two LLM calls run concurrently.
+    summary, topics = await asyncio.gather(
+        summarize_conversation(conversation_text),
+        detect_topics_llm(conversation_text),
+    )
+    return compose_draft(conversation_text, summary, topics, user_name, user_contact)
+
+async def run_session(session_id, user_name=None, user_contact=None):
+    # Starts from the session's rolling summary and folds in only the turns since its checkpoint,
+    # so draft cost stays flat however long the conversation gets. Every store read goes through the
+    # summarizer's thread, never the event loop.
+    prior_summary, recent_turns = await summarizer.checkpoint(session_id)
+    recent_text = "\n".join(filter(None, [prior_summary, format_turns(recent_turns)]))
+    (summary, _), topics = await asyncio.gather(
+        summarizer.fold(session_id),
+        detect_topics_llm(recent_text),
+    )
+    # Recipients come from the whole log, not the summary, so an address the LLM dropped while
+    # folding older turns still reaches the draft. A regex pass costs no LLM call.
+    emails = scan_transcript(text for _, _, text in await summarizer.turns(session_id)).emails
+    return compose_draft(recent_text, summary or None, topics, user_name, user_contact, emails)
 
+def compose_draft(conversation_text, summary, topics, user_name=None, user_contact=None, emails=None):
     if summary is None:
         raise RuntimeError("Summarization failed; cannot continue.")
 
 
-    emails_raw = extract_email(conversation_text) + extract_email(summary)
-
-    final_emails = []
-    seen = set()
-    for email in emails_raw:
-        if email not in seen:
-            final_emails.append(email)
-            seen.add(email)
-
+    final_emails = list(emails) if emails is not None else scan_transcript([conversation_text, summary]).emails
 
     if not final_emails:
         final_emails = ["team@Argano.com"]
-    topics = detect_topics_llm(conversation_text)
 
-    
     subject = build_subject(topics)
 
     return generate_email(summary, final_emails, user_name, user_contact,subject)
 
-@app.post("/process_and_email")
-def process_and_email(payload: dict):
-    messages = payload.get("messages", [])
-    user_name = payload.get("user_name")
-    user_contact = payload.get("user_contact")
+@app.get("/stats/llm_cache")
+def llm_cache_stats():
+    return llm.stats()
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(telemetry.render_metrics(), media_type="text/plain; version=0.0.4")
 
-    conversation_text = "\n".join(messages)
+@app.get("/stats/tokens")
+def token_stats():
+    return ledger.stats()
 
-    email_draft = run(conversation_text, user_name, user_contact)
+@app.get("/stats/jobs")
+def job_stats():
+    return draft_jobs.stats()
 
-    return {"email": email_draft}
+def draft_key(*parts):
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+async def run_draft_job(draft):
+    # Jobs outlive the request that queued them, so each one gets its own trace.
+    trace = telemetry.start_trace("draft_job")
+    try:
+        return {"email": await draft}
+    finally:
+        telemetry.finish_trace(trace)
+
+@app.post("/process_and_email", status_code=202)
+@telemetry.traced("/process_and_email")
+async def process_and_email(payload: dict):
+    # The chat service logs every turn under session_id, so clients only send the id.
+    # A full `messages` list is still accepted from clients that don't have a session.
+    # Drafting runs as a background job; poll /jobs/{job_id} or subscribe to /jobs/{job_id}/events.
+    session_id = payload.get("session_id")
+    messages = payload.get("messages")
+    user_name = payload.get("user_name")
+    user_contact = payload.get("user_contact")
+    set_token_labels(session=session_id, endpoint="/process_and_email")
+
+    last_turn_id = await summarizer.last_turn_id(session_id) if session_id else 0
+    if last_turn_id:
+        # Same session with no new turns (and the same sender details) means the same draft.
+        key = draft_key("session", session_id, last_turn_id, user_name, user_contact)
+        draft = lambda: run_session(session_id, user_name, user_contact)
+    elif messages:
+        conversation_text = "\n".join(messages)
+        key = draft_key("transcript", session_id, conversation_text, user_name, user_contact)
+        draft = lambda: run(conversation_text, user_name, user_contact)
+    else:
+        raise HTTPException(status_code=404, detail="No conversation found for this session")
+
+    try:
+        job = draft_jobs.submit(lambda: run_draft_job(draft()), key=key)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job.as_dict()
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = draft_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.as_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    job = draft_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+
+    async def events():
+        yield f"event: status\ndata: {json.dumps({'job_id': job.job_id, 'status': job.status})}\n\n"
+        await job.done.wait()
+        yield f"event: done\ndata: {json.dumps(job.as_dict())}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
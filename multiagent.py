@@ -1,62 +1,69 @@
 import json
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import os
-import re
-import math
 from dotenv import load_dotenv
-from typing import Dict, Any, List, Optional
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
 from langchain_community.vectorstores import Chroma
 from langchain.chat_models import init_chat_model
-import google.generativeai as genai
+from embed_cache import make_embeddings
+from extraction import find_contact, stated_name
+from llm_cache import CachingLLM
+from token_accounting import TokenUsage, account, ledger, response_text, set_token_labels, token_scope
+from telemetry import Telemetry, current_trace
+from context_packing import pack_context
+from retrieval import Retrieval, make_retriever, retrieve
+from semantic_cache import SemanticCache, read_index_version
+from session_store import SessionRecord, make_session_store
+from conversation_store import ConversationStore
+from rolling_summary import RollingSummarizer
+from router import route_message
+from prefilter import RulePreClassifier
 
 
 load_dotenv()
-PDF_DIR = "./sample_files"     
 PERSIST_DIR = "./db"       
 EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+PERSONA_REWRITE = os.getenv("PERSONA_REWRITE", "false").lower() == "true"
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH")
 
 
-session_memory: Dict[str, Dict[str, Any]] = {}
+telemetry = Telemetry("multiagent", ledger=ledger)
+sessions = make_session_store()
+conversations = ConversationStore()
+pre_classifier = RulePreClassifier()
 
-all_docs = []
-for fname in os.listdir(PDF_DIR):
-    if fname.lower().endswith(".pdf"):
-        path = os.path.join(PDF_DIR, fname)
-        loader = PyPDFLoader(path)
-        pages = loader.load()
-        for p in pages:
-            p.metadata["source"] = fname
-        all_docs.extend(pages)
-
-embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
+embeddings = make_embeddings(EMBED_MODEL)
 
 if not os.path.exists(PERSIST_DIR):
-    print("Creating new Chroma DB...")
-    docs = text_splitter.split_documents(all_docs)
+    raise RuntimeError(f"No Chroma DB found at {PERSIST_DIR}. Build it first with: python ingest.py")
+telemetry.event("chroma_loaded", persist_dir=PERSIST_DIR)
+db = Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
+retriever = make_retriever(db, persist_dir=PERSIST_DIR)
 
-    for i, d in enumerate(docs):
-        d.metadata.setdefault("chunk_id", f"chunk_{i}")
-    db = Chroma.from_documents(docs, embeddings, persist_directory=PERSIST_DIR)
-    db.persist()
-else:
-    print("Using existing Chroma DB...")
-    db = Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
+semantic_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=SEMANTIC_CACHE_TTL,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    path=SEMANTIC_CACHE_PATH,
+    index_version=lambda: read_index_version(PERSIST_DIR),
+) if SEMANTIC_CACHE_ENABLED else None
 
 
-llm = init_chat_model(
+llm = CachingLLM(init_chat_model(
     model="gemini-2.5-flash",       
     model_provider="openai",         
     api_key=GOOGLE_API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai" 
-)
+    base_url="https://generativelanguage.googleapis.com/v1beta/openai",
+    stream_usage=True,
+), ledger=ledger)
 
 '''llm = init_chat_model(
     model="microsoft/phi-4",               
@@ -67,11 +74,13 @@ llm = init_chat_model(
 
 
 
-def estimate_tokens_from_text(text: str) -> int:
+async def complete_text(prompt: str) -> str:
+    with token_scope(agent="rolling_summary"):
+        response = await llm.ainvoke(prompt, cache=False)
+    return response_text(response)
 
-    if not text:
-        return 0
-    return math.ceil(len(text) / 4)
+
+summarizer = RollingSummarizer(conversations, complete_text)
 
 def client_key_from_request(req: Request, session_id: str = None) -> str:
 
@@ -80,16 +89,6 @@ def client_key_from_request(req: Request, session_id: str = None) -> str:
     client_host = req.client.host if req.client else "unknown"
     return client_host
 
-def fetch_top_chunks(query: str, k: int = 3):
-
-    try:
-        results = db.similarity_search_with_score(query, k=k)
-    except Exception as e:
-        print("Error in similarity search:", e)
-        results = []
-    return results
-
-
 personalities={
     "naruto": {
         "role": "A determined ninja consultant inspired by Naruto",
@@ -120,10 +119,7 @@ personalities={
 
 
 
-def inject_personality(answer: str, user_input: str = "",personality_mode: str = "normal") -> str:
-    if personality_mode == "normal" or personality_mode not in personalities:
-        return answer
-    
+def build_personality_prompt(answer: str, user_input: str, personality_mode: str) -> str:
     persona = personalities[personality_mode]
     
     prompt = f"""You are {persona['role']}.
@@ -138,16 +134,40 @@ def inject_personality(answer: str, user_input: str = "",personality_mode: str =
     Rewrite the answer to match your persona while keeping all the technical information intact.
     Make it engaging and memorable, but stay professional and on-brand for Argano.
     Keep it concise - don't add more than 1-2 sentences of personality flair."""
+    return prompt
+
+async def inject_personality(answer: str, user_input: str = "",personality_mode: str = "normal") -> str:
+    if personality_mode == "normal" or personality_mode not in personalities:
+        return answer
+    
+    prompt = build_personality_prompt(answer, user_input, personality_mode)
         
     try:
-        response = llm.invoke(prompt)
+        with telemetry.stage("persona"), token_scope(agent="persona"):
+            response = await llm.ainvoke(prompt)
         return response.content.strip()
     except Exception as e:
-        print(f"Personality injection error: {e}")
+        telemetry.error("persona_failed", error=str(e))
         ans=answer
     return ans
 
-def build_system_prompt(context_chunks: List[str]) -> str:
+def build_persona_instructions(personality_mode: str) -> str:
+    if personality_mode == "normal" or personality_mode not in personalities:
+        return ""
+    persona = personalities[personality_mode]
+    return f"""
+Persona (VERY IMPORTANT - apply it to how you word every answer):
+- You are {persona['role']}.
+- Your tone: {persona['tone']}
+- Your traits: {', '.join(persona['traits'])}
+- Your background: {persona['background']}
+- Your quirks/habits: {', '.join(persona['quirks'])}
+- Example lines: {' | '.join(persona['examples'])}
+- Keep all the technical information intact. Make it engaging and memorable, but stay professional and on-brand for Argano.
+- Keep it concise - don't add more than 1-2 sentences of personality flair.
+"""
+
+def build_system_prompt(context_chunks: List[str], personality_mode: str = "normal") -> str:
     chunk_summary = "\n\n".join(context_chunks) if context_chunks else ""
     prompt = f"""
 You are a polite, professional virtual receptionist (company assistant) for our company.
@@ -162,7 +182,7 @@ Behavior rules (VERY IMPORTANT):
 - Keep answers concise, factual, and helpful.
 - If the user introduced their name earlier in the session, greet them by name only when it is naturally required but not for every answer.
 - Give related emails from the documents if required or asked.
-
+{build_persona_instructions(personality_mode)}
 Context:
 {chunk_summary}
 
@@ -170,13 +190,11 @@ Respond naturally and use the context above.
 """
     return prompt
 
-def company_rag_response(query: str, client_key: str) -> Dict[str, Any]:
-    results = fetch_top_chunks(query, k=3)
+def build_rag_input(query: str, user_name: Optional[str], retrieval: Retrieval, personality_mode: str = "normal") -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+    results = retrieval.results
 
     used_chunks = []
-    context_texts = []
 
-    print("\nRetrieved Chunks\n")
     for i, item in enumerate(results, start=1):
         if isinstance(item, tuple) and len(item) == 2:
             doc, score = item
@@ -187,11 +205,6 @@ def company_rag_response(query: str, client_key: str) -> Dict[str, Any]:
         chunk_id = doc.metadata.get("chunk_id", f"chunk_{i}") if doc else f"chunk_{i}"
         preview = (doc.page_content[:300] + "...") if doc else ""
 
-        print(f"--- Chunk {i} ---")
-        print(f"Chunk ID: {chunk_id}")
-        print(f"Score: {score}")
-        print(f"Source: {doc.metadata.get('source') if doc else None}")
-
         used_chunks.append({
             "chunk_id": chunk_id,
             "score": score,
@@ -199,40 +212,41 @@ def company_rag_response(query: str, client_key: str) -> Dict[str, Any]:
             "preview": preview,
         })
 
-        if doc:
-            context_texts.append(doc.page_content)
+    packed = pack_context([(item[0], item[1] if len(item) == 2 else None) for item in results if item])
+    context = packed.stats()
+    telemetry.event("context_packed", chunks=[(c["chunk_id"], c["score"], c["source"]) for c in used_chunks], **context)
 
-    system_prompt = build_system_prompt(context_texts)
-    sess = session_memory.get(client_key, {})
-    user_name = sess.get("name")
+    system_prompt = build_system_prompt(packed.texts, personality_mode)
 
     if user_name:
         system_prompt += f"\n\nSession user name: {user_name}\n"
 
     final_input = f"{system_prompt}\n\nUser question: {query}\n\nAnswer:"
+    return final_input, used_chunks, context
+
+async def company_rag_response(query: str, user_name: Optional[str], retrieval: Retrieval, personality_mode: str = "normal") -> Dict[str, Any]:
+    final_input, used_chunks, context = build_rag_input(query, user_name, retrieval, personality_mode)
 
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        token_count_response = model.count_tokens(final_input)
-        prompt_tokens = token_count_response.total_tokens
-        
-        response = llm.invoke(final_input)
+        with telemetry.stage("generation"), token_scope(agent="rag"):
+            response = await llm.ainvoke(final_input, cache=False)
         text = getattr(response, "content", None) or str(response)
 
-        completion_tokens = estimate_tokens_from_text(text)
-        total_tokens = prompt_tokens + completion_tokens
+        usage = account(response, final_input, text)
+        prompt_tokens = usage.prompt_tokens
+        completion_tokens = usage.completion_tokens
+        total_tokens = usage.total_tokens
+
+        telemetry.event("token_usage", agent="rag", exact=usage.exact, prompt_tokens=prompt_tokens,
+                        completion_tokens=completion_tokens, total_tokens=total_tokens)
 
-        print("\n===== Token Usage =====")
-        print(f"Prompt Tokens: {prompt_tokens}")
-        print(f"Completion Tokens: {completion_tokens}")
-        print(f"Total Tokens: {total_tokens}\n")
-            
     except Exception as e:
-        print(f"LLM Error: {str(e)}\n")
+        telemetry.error("llm_failed", error=str(e))
         return {
             "answer": "Error: LLM invocation failed.",
             "tokens": 0,
             "used_chunks": used_chunks,
+            "context": context,
             "llm_error": str(e)
         }
 
@@ -242,139 +256,34 @@ def company_rag_response(query: str, client_key: str) -> Dict[str, Any]:
         "prompt_tokens": prompt_tokens,
         "completion_tokens": completion_tokens,
         "used_chunks": used_chunks,
+        "context": context,
     }
 
 
-def is_relevant_to_company(query: str, threshold_high: float = 1.1, threshold_low: float = 1.7) -> tuple:
-
-    try:
-        results = db.similarity_search_with_score(query, k=1)
-    except Exception as e:
-        print("similarity check error:", e)
-        return 'not_relevant', None
-    
-    if not results:
-        return 'not_relevant', None
-    
-    first = results[0]
-    if isinstance(first, tuple) and len(first) == 2:
-        _, score = first
-        try:
-            if score < threshold_low:
-                return 'highly_relevant', score
-            elif score < threshold_high:
-                return 'somewhat_relevant', score
-            else:
-                return 'not_relevant', score
-        except Exception:
-            return 'not_relevant', score
-    return 'not_relevant', None
-
-
-def classify_intent_and_extract(user_input: str, client_key: str) -> dict:
-    stored_name = session_memory.get(client_key, {}).get("name")
-    
-    prompt = f"""
-    Analyze the user's message.
-    User Input: "{user_input}"
-    Context: User Name is "{stored_name}" if known.
-
-    Classify into ONE category:
-    1. GREETING_ONLY: User is ONLY greeting (e.g. "Hello","Hi", "Hey", "Wassup") or even they are identify themselves. No questions asked.
-    2. QUESTION: User is asking for information, even if they say hi or name first (e.g., "Hi, what is AWS?", "Tell me about services").
-    
-    If GREETING_ONLY, generate a warm greeting response and if they just identified themselves just greet by name(nice to meet you)but dont offer any services.
-    If QUESTION, return "RAG_REQUIRED".
-
-    Output JSON format:
-    {{
-        "intent": "GREETING_ONLY" | "QUESTION",
-        "response_text": "your generated response if greeting, else null"
-    }}
-    """
-    try:
-        response = llm.invoke(prompt)
-        text = response.content.strip()
-        
+async def generate_rag_answer(query: str, user_name: Optional[str], retrieval: Retrieval, personality_mode: str = "normal") -> Dict[str, Any]:
+    # One generation with the persona in the prompt, or with PERSONA_REWRITE the plain answer plus a rewrite.
+    if PERSONA_REWRITE:
+        rag_resp = await company_rag_response(query, user_name, retrieval)
+        rag_answer = rag_resp["answer"]
+        rag_resp["answer"] = await inject_personality(rag_answer, query, personality_mode)
+    else:
+        rag_resp = await company_rag_response(query, user_name, retrieval, personality_mode)
+        rag_answer = rag_resp["answer"]
+    rag_resp["word_count"] = len(rag_answer.split())
+    return rag_resp
 
-        if text.startswith("```"):
-            text = text.split('\n', 1)[1]
-        if text.endswith("```"):
-            text = text.rsplit('\n', 1)[0]
-        
-        text = text.strip()
-        
-        import json
-        result = json.loads(text)
-        
-        return result
-    except Exception as e:
-        print(f"[ERROR] Intent parsing failed: {e}")
-        print(f"[ERROR] Returning fallback QUESTION\n")
-        return {"intent": "QUESTION", "response_text": None}
-    
-def is_acknowledgment_with_response(user_input: str, client_key: str) -> dict:
-    stored_name = session_memory.get(client_key, {}).get("name")
-    
-    prompt = f"""Determine if this user message is an acknowledgment, confirmation, agreement, or compliment (like okay, got it, thanks, understood, nice, good, impressive, cool, etc).
 
-User message: "{user_input}"
-Context: User Name is "{stored_name}" if known.
+def cache_rag_answer(query: str, user_name: Optional[str], personality_mode: str, retrieval: Retrieval, rag_resp: Dict[str, Any]):
+    if semantic_cache is None or rag_resp.get("llm_error"):
+        return
+    if user_name and user_name.lower() in rag_resp["answer"].lower():
+        # Personalised answers must not be served to other sessions.
+        return
+    chunk_ids = [c["chunk_id"] for c in rag_resp.get("used_chunks", [])]
+    payload = {k: v for k, v in rag_resp.items() if k != "name"}
+    semantic_cache.store(query, retrieval.query_embedding, personality_mode, chunk_ids, payload)
 
-If YES (acknowledgment), generate a brief acknowledgment response (1-2 sentences) saying you're here to help and asking what they need.
-If NO (has question or not acknowledgment), return null for response_text.
 
-Output JSON format:
-{{
-    "intent": "ACKNOWLEDGE_ONLY" | "QUESTION",
-    "response_text": "your generated response if acknowledgment, else null"
-}}"""
-    
-    try:
-        response = llm.invoke(prompt)
-        text = response.content.strip()
-        
-        if text.startswith("```"):
-            text = text.split('\n', 1)[1]
-        if text.endswith("```"):
-            text = text.rsplit('\n', 1)[0]
-        
-        text = text.strip()
-        
-        result = json.loads(text)
-        return result
-    except Exception as e:
-        print(f"Acknowledgment check error: {e}")
-        return {"intent": "QUESTION", "response_text": None}
-
-
-def extract_name_with_llm(text: str) -> str:
-    prompt = f"""Extract the person's name from this message.
-User message: "{text}"
-Rules:
-- Extract ONLY if a real person name is mentioned
-- Return just the name (capitalized)
-- Return "NONE" if no name found
-- Extract even if the message contains name and some other information or query along with the name.
-Examples:
-- "my name is John" → John
-- "I'm Sarah" → Sarah
-- "hello" → NONE
-- "call me Mike" → Mike
-- "my name is Sasank and i want to know about aws" -> Sasank
-Your answer (ONLY the name or NONE):"""
-    
-    try:
-        response = llm.invoke(prompt)
-        result = response.content.strip()
-        
-        if result.upper() == "NONE":
-            return None
-        
-    except Exception as e:
-        print(f"Name extraction error: {e}")
-        return None
-    
 app = FastAPI(title="Company Receptionist RAG API")
 
 app.add_middleware(
@@ -391,58 +300,68 @@ class QueryIn(BaseModel):
     personality_mode: str = "normal" 
 
 
-@app.post("/ask")
-async def ask_api(data: QueryIn, request: Request):
-    user_input = data.query.strip()
-    client_key = client_key_from_request(request, data.session_id)
-    personality_mode = data.personality_mode
-    name = extract_name_with_llm(user_input)
-    if name:
-        session_memory.setdefault(client_key, {})["name"] = name
-    contact_pattern = r"(\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b|(?:\+?1?\d{9,15}))"
-    contact_match = re.search(contact_pattern, user_input)
-    if contact_match:
-        contact = contact_match.group(0)
-        session_memory.setdefault(client_key, {})["contact"] = contact
+@app.get("/stats/preclassifier")
+def preclassifier_stats():
+    return pre_classifier.stats()
+
+
+async def route_turn(user_input: str, client_key: str, personality_mode: str) -> Tuple[Optional[Dict[str, Any]], Optional[Retrieval], SessionRecord]:
+    # (response, None, session) when the turn is answered without RAG, (None, retrieval, session) when RAG
+    # should answer. The session is read once here and handed on, so a turn makes at most one read and one write.
+    # Contact details are captured on every turn, whatever its length, before any classifier runs.
+    with telemetry.stage("contact"):
+        contact = find_contact(user_input)
+    if contact:
+        fields = {"contact": contact}
+        name = stated_name(user_input)
+        if name:
+            fields["name"] = name
+        session = await sessions.aupdate(client_key, **fields)
         return {
             "answer": "Got it! Please click **Draft** when you're ready to send.",
-            "name": session_memory.get(client_key, {}).get("name")
-        }
-    ack_result = is_acknowledgment_with_response(user_input, client_key)
-    ack_intent = ack_result.get("intent")
-    ack_response = ack_result.get("response_text")
-
-    if ack_intent == "ACKNOWLEDGE_ONLY":
-        final_answer = inject_personality(ack_response, user_input, personality_mode)
-        print(f"\nAgent: Acknowledgment Handler\n")
-        return {"answer": final_answer, "agent_type": "acknowledgment","name": session_memory.get(client_key, {}).get("name")}
-    
-    result = classify_intent_and_extract(user_input, client_key)
-    intent = result.get("intent")
-    llm_response = result.get("response_text")
-
-    if intent == "GREETING_ONLY":
-        final_answer = inject_personality(llm_response, user_input, personality_mode)
-        print(f"\nAgent: Greeting Agent\n")
-        return {"answer": final_answer, "agent_type": "greeting","name": session_memory.get(client_key, {}).get("name")}
+            "name": session.name,
+            "contact": contact
+        }, None, session
+
+    session = await sessions.aget(client_key)
+    stored_name = session.name
+    with telemetry.stage("prefilter"):
+        route = pre_classifier.classify(user_input, stored_name)
+    styled = False
+    if route is None:
+        persona_instructions = "" if PERSONA_REWRITE else build_persona_instructions(personality_mode)
+        with telemetry.stage("intent"), token_scope(agent="router"):
+            route = await route_message(llm, user_input, stored_name, persona_instructions)
+        styled = bool(persona_instructions)
+    name = route.name
+    if name:
+        session = await sessions.aupdate(client_key, name=name)
+    if route.intent == "ACKNOWLEDGE_ONLY":
+        final_answer = route.response_text if styled else await inject_personality(route.response_text, user_input, personality_mode)
+        telemetry.event("agent", agent="acknowledgment")
+        return {"answer": final_answer, "agent_type": "acknowledgment","name": session.name}, None, session
+
+    if route.intent == "GREETING_ONLY":
+        final_answer = route.response_text if styled else await inject_personality(route.response_text, user_input, personality_mode)
+        telemetry.event("agent", agent="greeting")
+        return {"answer": final_answer, "agent_type": "greeting","name": session.name}, None, session
     
     
     
     
-    relevance_type, top_score = is_relevant_to_company(user_input)
+    with telemetry.stage("retrieval"):
+        retrieval = await retrieve(retriever, embeddings, user_input, k=3)
+    relevance_type, top_score = retrieval.relevance, retrieval.top_score
     
     if relevance_type == 'highly_relevant':
-        rag_resp = company_rag_response(user_input, client_key)
-        rag_answer = rag_resp["answer"]
-        persona_answer=inject_personality(rag_answer,user_input,personality_mode)
-        print(f"\nAgent: RAG Agent\n")
-        rag_resp["answer"]=persona_answer
-        rag_resp["word_count"] = len(rag_answer.split())
-        rag_resp["top_score"] = top_score
-        rag_resp["name"]=session_memory.get(client_key, {}).get("name")
-        
-        
-        return rag_resp
+        with telemetry.stage("semantic_cache"):
+            cached = semantic_cache.lookup(retrieval.query_embedding, personality_mode) if semantic_cache else None
+        if cached is not None:
+            telemetry.event("agent", agent="rag", semantic_cache_hit=True, top_score=top_score)
+            cached["top_score"] = top_score
+            cached["name"] = session.name
+            return cached, None, session
+        return None, retrieval, session
     
     elif relevance_type == 'somewhat_relevant':
         answer = (
@@ -450,22 +369,173 @@ async def ask_api(data: QueryIn, request: Request):
             "However, this is something our team can definitely help you with! "
             "Please share your name and contact number, and click **Draft** to get in touch with someone who can assist."
         )
-        persona_answer=inject_personality(answer,user_input,personality_mode)
-        print(f"\nAgent: Out-of-scope Handler (Related)\nAnswer: {answer}\n")
+        persona_answer=await inject_personality(answer,user_input,personality_mode)
+        telemetry.event("agent", agent="out_of_scope_related", top_score=top_score)
         return {
             "answer": persona_answer,
             "top_score": top_score,
             "word_count": len(answer.split()),
-            "name": session_memory.get(client_key, {}).get("name")
-        }
+            "name": session.name
+        }, None, session
     
     else:
         answer = "I can only answer questions related to our company's services and offerings. How else can I assist you?"
-        print(f"\nAgent: Out-of-scope Handler (Unrelated)\nAnswer: {answer}\n")
+        telemetry.event("agent", agent="out_of_scope_unrelated", top_score=top_score)
         return {
             "answer": answer,
             "top_score": top_score,
             "word_count": len(answer.split()),
-            "name": session_memory.get(client_key, {}).get("name")
-        }
+            "name": session.name
+        }, None, session
+
+
+@app.get("/stats/semantic_cache")
+def semantic_cache_stats():
+    return semantic_cache.stats() if semantic_cache else {"enabled": False}
+
 
+@app.get("/stats/llm_cache")
+def llm_cache_stats():
+    return llm.stats()
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(telemetry.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats/tokens")
+def token_stats(request: Request, session_id: Optional[str] = None):
+    stats = ledger.stats()
+    stats["session"] = ledger.session_stats(client_key_from_request(request, session_id))
+    return stats
+
+
+@app.post("/ask")
+@telemetry.traced("/ask")
+async def ask_api(data: QueryIn, request: Request):
+    user_input = data.query.strip()
+    client_key = client_key_from_request(request, data.session_id)
+    set_token_labels(session=client_key, endpoint="/ask")
+    personality_mode = data.personality_mode
+    response, retrieval, session = await route_turn(user_input, client_key, personality_mode)
+    if response is not None:
+        summarizer.record_turn(data.session_id, user_input, response.get("answer"))
+        return response
+
+    rag_resp = await generate_rag_answer(user_input, session.name, retrieval, personality_mode)
+    telemetry.event("agent", agent="rag", top_score=retrieval.top_score)
+    rag_resp["top_score"] = retrieval.top_score
+    rag_resp["name"]=session.name
+    cache_rag_answer(user_input, session.name, personality_mode, retrieval, rag_resp)
+    summarizer.record_turn(data.session_id, user_input, rag_resp["answer"])
+
+    return rag_resp
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_llm_text(prompt: str, usages: List[TokenUsage]) -> AsyncIterator[str]:
+    # Streams bypass CachingLLM, so usage is summed from the chunks here and recorded once the stream ends.
+    parts: List[str] = []
+    streamed = TokenUsage(exact=False)
+    async for chunk in llm.astream(prompt):
+        chunk_usage = account(chunk, "", "")
+        if chunk_usage.exact:
+            streamed.prompt_tokens += chunk_usage.prompt_tokens
+            streamed.completion_tokens += chunk_usage.completion_tokens
+            streamed.exact = True
+        text = getattr(chunk, "content", None) or ""
+        if text:
+            parts.append(text)
+            yield text
+    usage = streamed if streamed.exact else account(None, prompt, "".join(parts))
+    ledger.record(usage)
+    usages.append(usage)
+
+
+async def stream_rag_events(user_input: str, client_key: str, user_name: Optional[str], personality_mode: str,
+                            retrieval: Retrieval, session_id: Optional[str] = None) -> AsyncIterator[str]:
+    rewrite = PERSONA_REWRITE and personality_mode in personalities
+    prompt_mode = "normal" if rewrite else personality_mode
+    final_input, used_chunks, context = build_rag_input(user_input, user_name, retrieval, prompt_mode)
+    set_token_labels(session=client_key, endpoint="/ask/stream", agent="rag")
+    parts: List[str] = []
+    usages: List[TokenUsage] = []
+    try:
+        if not rewrite:
+            with telemetry.stage("generation"):
+                async for text in stream_llm_text(final_input, usages):
+                    parts.append(text)
+                    yield sse_event("token", {"text": text})
+            rag_answer = "".join(parts)
+        else:
+            with telemetry.stage("generation"):
+                response = await llm.ainvoke(final_input, cache=False)
+            rag_answer = getattr(response, "content", None) or str(response)
+            usages.append(account(response, final_input, rag_answer))
+            persona_prompt = build_personality_prompt(rag_answer, user_input, personality_mode)
+            set_token_labels(agent="persona")
+            with telemetry.stage("persona"):
+                async for text in stream_llm_text(persona_prompt, usages):
+                    parts.append(text)
+                    yield sse_event("token", {"text": text})
+    except Exception as e:
+        telemetry.error("llm_failed", error=str(e))
+        yield sse_event("error", {"llm_error": str(e)})
+        yield sse_event("done", {"tokens": 0, "used_chunks": used_chunks, "context": context, "top_score": retrieval.top_score})
+        return
+
+    answer = "".join(parts)
+    prompt_tokens = sum(u.prompt_tokens for u in usages)
+    completion_tokens = sum(u.completion_tokens for u in usages)
+    telemetry.event("agent", agent="rag", stream=True, top_score=retrieval.top_score,
+                    prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    meta = {
+        "tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "used_chunks": used_chunks,
+        "context": context,
+        "top_score": retrieval.top_score,
+        "word_count": len(rag_answer.split()),
+        "name": user_name,
+    }
+    yield sse_event("done", meta)
+    cache_rag_answer(user_input, user_name, personality_mode, retrieval, {"answer": answer, **meta})
+    summarizer.record_turn(session_id, user_input, answer)
+
+
+@app.post("/ask/stream")
+async def ask_stream_api(data: QueryIn, request: Request):
+    user_input = data.query.strip()
+    client_key = client_key_from_request(request, data.session_id)
+    set_token_labels(session=client_key, endpoint="/ask/stream")
+    trace = telemetry.start_trace("/ask/stream")
+    personality_mode = data.personality_mode
+    response, retrieval, session = await route_turn(user_input, client_key, personality_mode)
+
+    async def events() -> AsyncIterator[str]:
+        # The trace stays open until the last event is sent, so it covers generation too.
+        current_trace.set(trace)
+        try:
+            if response is not None:
+                meta = dict(response)
+                answer = meta.pop("answer")
+                yield sse_event("token", {"text": answer})
+                yield sse_event("done", meta)
+                summarizer.record_turn(data.session_id, user_input, answer)
+                return
+            async for event in stream_rag_events(user_input, client_key, session.name, personality_mode,
+                                                 retrieval, data.session_id):
+                yield event
+        finally:
+            telemetry.finish_trace(trace)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
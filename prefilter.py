@@ -0,0 +1,101 @@
+import re
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Dict, Any, Optional
+from router import RouteResult
+from extraction import NAME_INTRO_RE, classify_name
+
+
+GREETING_WORDS = {
+    "hi", "hii", "hello", "hey", "heya", "hiya", "yo", "wassup", "sup", "greetings",
+    "howdy", "morning", "afternoon", "evening", "good", "there", "namaste",
+}
+ACK_WORDS = {
+    "ok", "okay", "okk", "k", "kk", "thanks", "thank", "thx", "ty", "got",
+    "understood", "cool", "nice", "great", "good", "awesome", "impressive", "perfect",
+    "alright", "sure", "noted", "fine", "sounds", "makes", "sense", "wow", "amazing",
+    "excellent", "right", "yes", "yep",
+}
+# Allowed around greeting/acknowledgment words but never enough on their own ("you", "so").
+FILLER_WORDS = {
+    "and", "a", "lot", "again", "then", "oh", "ah", "you", "it", "so", "very", "much", "that's", "thats",
+}
+
+WORD_RE = re.compile(r"[a-z']+")
+PUNCT_ONLY_RE = re.compile(r"^[\s!.,:;)(\-~*]*$")
+QUESTION_HINT_RE = re.compile(r"\?")
+
+
+
+def greeting_reply(name: Optional[str]) -> str:
+    if name:
+        return f"Hello {name}! I'm the Argano assistant. How can I help you today?"
+    return "Hello! I'm the Argano assistant. How can I help you today?"
+
+
+def acknowledgment_reply(name: Optional[str]) -> str:
+    if name:
+        return f"Great! I'm here to help you, {name}. What would you like to know about Argano's services?"
+    return "Great! I'm here to help you. What would you like to know about Argano's services?"
+
+
+class PreClassifier(ABC):
+    # classify() returns a RouteResult for greetings and acknowledgments it is confident about,
+    # or None to defer to the LLM router. Contact details are captured before it runs.
+
+    def __init__(self):
+        self.counters: Counter = Counter()
+
+    def classify(self, user_input: str, stored_name: Optional[str] = None) -> Optional[RouteResult]:
+        result = self._classify(user_input, stored_name)
+        self.counters["total"] += 1
+        if result is None:
+            self.counters["llm_fallthrough"] += 1
+        else:
+            self.counters["hits"] += 1
+            self.counters[f"hit_{result.intent.lower()}"] += 1
+        return result
+
+    @abstractmethod
+    def _classify(self, user_input: str, stored_name: Optional[str]) -> Optional[RouteResult]:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.counters["total"]
+        stats = dict(self.counters)
+        stats["hit_rate"] = (self.counters["hits"] / total) if total else 0.0
+        return stats
+
+
+class RulePreClassifier(PreClassifier):
+
+    def _classify(self, user_input: str, stored_name: Optional[str]) -> Optional[RouteResult]:
+        text = user_input.strip()
+        if not text or len(text) > 200:
+            return None
+
+        if QUESTION_HINT_RE.search(text):
+            return None
+
+        intro = NAME_INTRO_RE.match(text)
+        if intro:
+            name = intro.group(1).capitalize()
+            # Only names the lexicon knows; anything else ("my name is working") is the router's call.
+            if classify_name(name):
+                return RouteResult(name=name, intent="GREETING_ONLY",
+                                   response_text=f"Nice to meet you, {name}!")
+            return None
+
+        lowered = text.lower()
+        words = WORD_RE.findall(lowered)
+        if not words or not PUNCT_ONLY_RE.match(WORD_RE.sub("", lowered)):
+            return None
+
+        vocab = set(words) - FILLER_WORDS
+        if not vocab:
+            return None
+        if vocab <= GREETING_WORDS and vocab - {"good", "there"}:
+            return RouteResult(intent="GREETING_ONLY", response_text=greeting_reply(stored_name))
+        if vocab <= ACK_WORDS:
+            return RouteResult(intent="ACKNOWLEDGE_ONLY", response_text=acknowledgment_reply(stored_name))
+        return None
@@ -1,62 +1,63 @@
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 import os
 import re
-import math
 from dotenv import load_dotenv
 from typing import Dict, Any, List, Optional
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.chat_models import init_chat_model
-import google.generativeai as genai
+from embed_cache import make_embeddings
+from extraction import classify_name, find_contact, name_candidates
+from llm_cache import CachingLLM
+from token_accounting import account, ledger, set_token_labels, token_scope
+from telemetry import Telemetry
+from context_packing import pack_context
+from retrieval import Retrieval, make_retriever, retrieve
+from semantic_cache import SemanticCache, read_index_version
+from session_store import make_session_store
 
 
 load_dotenv()
-PDF_DIR = "./sample_files"     
 PERSIST_DIR = "./db"       
 EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+PERSONA_REWRITE = os.getenv("PERSONA_REWRITE", "false").lower() == "true"
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH")
 
 
 
-session_memory: Dict[str, Dict[str, Any]] = {}
+telemetry = Telemetry("recp", ledger=ledger)
+sessions = make_session_store()
 
-all_docs = []
-for fname in os.listdir(PDF_DIR):
-    if fname.lower().endswith(".pdf"):
-        path = os.path.join(PDF_DIR, fname)
-        loader = PyPDFLoader(path)
-        pages = loader.load()
-        for p in pages:
-            p.metadata["source"] = fname
-        all_docs.extend(pages)
-
-embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
+embeddings = make_embeddings(EMBED_MODEL)
 
 if not os.path.exists(PERSIST_DIR):
-    print("Creating new Chroma DB...")
-    docs = text_splitter.split_documents(all_docs)
+    raise RuntimeError(f"No Chroma DB found at {PERSIST_DIR}. Build it first with: python ingest.py")
+telemetry.event("chroma_loaded", persist_dir=PERSIST_DIR)
+db = Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
+retriever = make_retriever(db, persist_dir=PERSIST_DIR)
 
-    for i, d in enumerate(docs):
-        d.metadata.setdefault("chunk_id", f"chunk_{i}")
-    db = Chroma.from_documents(docs, embeddings, persist_directory=PERSIST_DIR)
-    db.persist()
-else:
-    print("Using existing Chroma DB...")
-    db = Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
+semantic_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=SEMANTIC_CACHE_TTL,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    path=SEMANTIC_CACHE_PATH,
+    index_version=lambda: read_index_version(PERSIST_DIR),
+) if SEMANTIC_CACHE_ENABLED else None
 
 
-llm = init_chat_model(
+llm = CachingLLM(init_chat_model(
     model="gemini-2.5-flash",       
     model_provider="openai",         
     api_key=GOOGLE_API_KEY,
     base_url="https://generativelanguage.googleapis.com/v1beta/openai" 
-)
+), ledger=ledger)
 '''llm = init_chat_model(
     model="microsoft/phi-4",               
     model_provider="openai",
@@ -65,7 +66,10 @@ llm = init_chat_model(
 )'''
 
 
-def is_person_name(name: str) -> bool:
+async def is_person_name(name: str) -> bool:
+    verdict = classify_name(name)
+    if verdict is not None:
+        return verdict
     prompt = f"""You are a strict name validator.
 
 Input: "{name}"
@@ -75,43 +79,20 @@ adjective, common noun, or phrase.
 
 Answer with EXACTLY one word: "yes" or "no"."""
     try:
-        resp = llm.invoke(prompt)
+        with token_scope(agent="name_check"):
+            resp = await llm.ainvoke(prompt)
         text = resp.content.strip().lower()
         return text == "yes"
     except Exception as e:
-        print("Name validation error:", e)
+        telemetry.error("name_check_failed", error=str(e))
         return False
 
-def extract_name(text: str) -> str:
-    patterns = [
-        r"\bmy name is\s+([A-Z][a-zA-Z\-']{1,40})\b",
-        r"\bI[' ]?am\s+([A-Z][a-zA-Z\-']{1,40})\b",
-        r"\bI'm\s+([A-Z][a-zA-Z\-']{1,40})\b",
-        r"\bthis is\s+([A-Z][a-zA-Z\-']{1,40})\b",
-        r"\bname is\s+([A-Z][a-zA-Z\-']{1,40})\b",
-        r"\bname-\s+([A-Z][a-zA-Z\-']{1,40})\b",
-        r"\bname:\s+([A-Z][a-zA-Z\-']{1,40})\b",
-        r"\bmyself\s+([A-Z][a-zA-Z\-']{1,40})\b",
-        r"\bname -\s+([A-Z][a-zA-Z\-']{1,40})\b",
-        r"\bname :\s+([A-Z][a-zA-Z\-']{1,40})\b",
-        r"\bname-\s*([A-Z][a-zA-Z\-']{1,40})\b",
-        r"\bname:\s*([A-Z][a-zA-Z\-']{1,40})\b"
-    ]
-    for p in patterns:
-        m = re.search(p, text, flags=re.IGNORECASE)
-        if m:
-            name = m.group(1).strip()
-            correct_name=name.capitalize()
-            if is_person_name(correct_name):
-                return correct_name
+async def extract_name(text: str) -> str:
+    for name in name_candidates(text):
+        if await is_person_name(name):
+            return name
     return None
 
-def estimate_tokens_from_text(text: str) -> int:
-
-    if not text:
-        return 0
-    return math.ceil(len(text) / 4)
-
 def client_key_from_request(req: Request, session_id: str = None) -> str:
 
     if session_id:
@@ -119,16 +100,6 @@ def client_key_from_request(req: Request, session_id: str = None) -> str:
     client_host = req.client.host if req.client else "unknown"
     return client_host
 
-def fetch_top_chunks(query: str, k: int = 3):
-
-    try:
-        results = db.similarity_search_with_score(query, k=k)
-    except Exception as e:
-        print("Error in similarity search:", e)
-        results = []
-    return results
-
-
 personalities={
     "naruto": {
         "role": "A determined ninja consultant inspired by Naruto",
@@ -159,7 +130,7 @@ personalities={
 
 
 
-def inject_personality(answer: str, user_input: str = "",personality_mode: str = "normal") -> str:
+async def inject_personality(answer: str, user_input: str = "",personality_mode: str = "normal") -> str:
     if personality_mode == "normal" or personality_mode not in personalities:
         return answer
     
@@ -179,14 +150,31 @@ def inject_personality(answer: str, user_input: str = "",personality_mode: str =
     Keep it concise - don't add more than 1-2 sentences of personality flair."""
         
     try:
-        response = llm.invoke(prompt)
+        with telemetry.stage("persona"), token_scope(agent="persona"):
+            response = await llm.ainvoke(prompt)
         return response.content.strip()
     except Exception as e:
-        print(f"Personality injection error: {e}")
+        telemetry.error("persona_failed", error=str(e))
         ans=answer
     return ans
 
-def build_system_prompt(context_chunks: List[str]) -> str:
+def build_persona_instructions(personality_mode: str) -> str:
+    if personality_mode == "normal" or personality_mode not in personalities:
+        return ""
+    persona = personalities[personality_mode]
+    return f"""
+Persona (VERY IMPORTANT - apply it to how you word every answer):
+- You are {persona['role']}.
+- Your tone: {persona['tone']}
+- Your traits: {', '.join(persona['traits'])}
+- Your background: {persona['background']}
+- Your quirks/habits: {', '.join(persona['quirks'])}
+- Example lines: {' | '.join(persona['examples'])}
+- Keep all the technical information intact. Make it engaging and memorable, but stay professional and on-brand for Argano.
+- Keep it concise - don't add more than 1-2 sentences of personality flair.
+"""
+
+def build_system_prompt(context_chunks: List[str], personality_mode: str = "normal") -> str:
     chunk_summary = "\n\n".join(context_chunks) if context_chunks else ""
     prompt = f"""
 You are a polite, professional virtual receptionist (company assistant) for our company.
@@ -201,7 +189,7 @@ Behavior rules (VERY IMPORTANT):
 - Keep answers concise, factual, and helpful.
 - If the user introduced their name earlier in the session, greet them by name only when it is naturally required but not for every answer.
 - Give related emails from the documents if required or asked.
-
+{build_persona_instructions(personality_mode)}
 Context:
 {chunk_summary}
 
@@ -209,13 +197,11 @@ Respond naturally and use the context above.
 """
     return prompt
 
-def company_rag_response(query: str, client_key: str) -> Dict[str, Any]:
-    results = fetch_top_chunks(query, k=3)
+async def company_rag_response(query: str, user_name: Optional[str], retrieval: Retrieval, personality_mode: str = "normal") -> Dict[str, Any]:
+    results = retrieval.results
 
     used_chunks = []
-    context_texts = []
 
-    print("\nRetrieved Chunks\n")
     for i, item in enumerate(results, start=1):
         if isinstance(item, tuple) and len(item) == 2:
             doc, score = item
@@ -226,11 +212,6 @@ def company_rag_response(query: str, client_key: str) -> Dict[str, Any]:
         chunk_id = doc.metadata.get("chunk_id", f"chunk_{i}") if doc else f"chunk_{i}"
         preview = (doc.page_content[:300] + "...") if doc else ""
 
-        print(f"--- Chunk {i} ---")
-        print(f"Chunk ID: {chunk_id}")
-        print(f"Score: {score}")
-        print(f"Source: {doc.metadata.get('source') if doc else None}")
-
         used_chunks.append({
             "chunk_id": chunk_id,
             "score": score,
@@ -238,12 +219,11 @@ def company_rag_response(query: str, client_key: str) -> Dict[str, Any]:
             "preview": preview,
         })
 
-        if doc:
-            context_texts.append(doc.page_content)
+    packed = pack_context([(item[0], item[1] if len(item) == 2 else None) for item in results if item])
+    context = packed.stats()
+    telemetry.event("context_packed", chunks=[(c["chunk_id"], c["score"], c["source"]) for c in used_chunks], **context)
 
-    system_prompt = build_system_prompt(context_texts)
-    sess = session_memory.get(client_key, {})
-    user_name = sess.get("name")
+    system_prompt = build_system_prompt(packed.texts, personality_mode)
 
     if user_name:
         system_prompt += f"\n\nSession user name: {user_name}\n"
@@ -251,27 +231,25 @@ def company_rag_response(query: str, client_key: str) -> Dict[str, Any]:
     final_input = f"{system_prompt}\n\nUser question: {query}\n\nAnswer:"
 
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        token_count_response = model.count_tokens(final_input)
-        prompt_tokens = token_count_response.total_tokens
-        
-        response = llm.invoke(final_input)
+        with telemetry.stage("generation"), token_scope(agent="rag"):
+            response = await llm.ainvoke(final_input, cache=False)
         text = getattr(response, "content", None) or str(response)
 
-        completion_tokens = estimate_tokens_from_text(text)
-        total_tokens = prompt_tokens + completion_tokens
+        usage = account(response, final_input, text)
+        prompt_tokens = usage.prompt_tokens
+        completion_tokens = usage.completion_tokens
+        total_tokens = usage.total_tokens
+
+        telemetry.event("token_usage", agent="rag", exact=usage.exact, prompt_tokens=prompt_tokens,
+                        completion_tokens=completion_tokens, total_tokens=total_tokens)
 
-        print("\n===== Token Usage =====")
-        print(f"Prompt Tokens: {prompt_tokens}")
-        print(f"Completion Tokens: {completion_tokens}")
-        print(f"Total Tokens: {total_tokens}\n")
-            
     except Exception as e:
-        print(f"LLM Error: {str(e)}\n")
+        telemetry.error("llm_failed", error=str(e))
         return {
             "answer": "Error: LLM invocation failed.",
             "tokens": 0,
             "used_chunks": used_chunks,
+            "context": context,
             "llm_error": str(e)
         }
 
@@ -281,35 +259,11 @@ def company_rag_response(query: str, client_key: str) -> Dict[str, Any]:
         "prompt_tokens": prompt_tokens,
         "completion_tokens": completion_tokens,
         "used_chunks": used_chunks,
+        "context": context,
     }
 
 
-def is_relevant_to_company(query: str, threshold_high: float = 1.1, threshold_low: float = 1.7) -> tuple:
-
-    try:
-        results = db.similarity_search_with_score(query, k=1)
-    except Exception as e:
-        print("similarity check error:", e)
-        return 'not_relevant', None
-    
-    if not results:
-        return 'not_relevant', None
-    
-    first = results[0]
-    if isinstance(first, tuple) and len(first) == 2:
-        _, score = first
-        try:
-            if score < threshold_low:
-                return 'highly_relevant', score
-            elif score < threshold_high:
-                return 'somewhat_relevant', score
-            else:
-                return 'not_relevant', score
-        except Exception:
-            return 'not_relevant', score
-    return 'not_relevant', None
-
-def is_acknowledgment(user_input: str) -> bool:
+async def is_acknowledgment(user_input: str) -> bool:
     prompt = f"""Determine if this user message is an acknowledgment, confirmation, or agreement or a compliment(like okay, got it, thanks, understood,thats impressive,nice,good etc).
     
 User message: "{user_input}"
@@ -317,13 +271,25 @@ User message: "{user_input}"
 Respond with ONLY "yes" or "no"."""
     
     try:
-        response = llm.invoke(prompt)
+        with token_scope(agent="acknowledgment"):
+            response = await llm.ainvoke(prompt)
         result = response.text.strip().lower()
         return "yes" in result
     except Exception as e:
-        print(f"Error in acknowledgment check: {e}")
+        telemetry.error("ack_check_failed", error=str(e))
         return False
     
+def cache_rag_answer(query: str, user_name: Optional[str], personality_mode: str, retrieval: Retrieval, rag_resp: Dict[str, Any]):
+    if semantic_cache is None or rag_resp.get("llm_error"):
+        return
+    if user_name and user_name.lower() in rag_resp["answer"].lower():
+        # Personalised answers must not be served to other sessions.
+        return
+    chunk_ids = [c["chunk_id"] for c in rag_resp.get("used_chunks", [])]
+    payload = {k: v for k, v in rag_resp.items() if k != "name"}
+    semantic_cache.store(query, retrieval.query_embedding, personality_mode, chunk_ids, payload)
+
+
 app = FastAPI(title="Company Receptionist RAG API")
 
 app.add_middleware(
@@ -340,31 +306,56 @@ class QueryIn(BaseModel):
     personality_mode: str = "normal" 
 
 
+@app.get("/stats/semantic_cache")
+def semantic_cache_stats():
+    return semantic_cache.stats() if semantic_cache else {"enabled": False}
+
+
+@app.get("/stats/llm_cache")
+def llm_cache_stats():
+    return llm.stats()
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(telemetry.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats/tokens")
+def token_stats(request: Request, session_id: Optional[str] = None):
+    stats = ledger.stats()
+    stats["session"] = ledger.session_stats(client_key_from_request(request, session_id))
+    return stats
+
+
 @app.post("/ask")
+@telemetry.traced("/ask")
 async def ask_api(data: QueryIn, request: Request):
     user_input = data.query.strip()
     client_key = client_key_from_request(request, data.session_id)
+    set_token_labels(session=client_key, endpoint="/ask")
     personality_mode = data.personality_mode
-    name = extract_name(user_input)
-    if name:
-        session_memory.setdefault(client_key, {})["name"] = name
-    contact_pattern = r"(\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b|(?:\+?1?\d{9,15}))"
-    contact_match = re.search(contact_pattern, user_input)
-    if contact_match:
-        contact = contact_match.group(0)
-        session_memory.setdefault(client_key, {})["contact"] = contact
+    with telemetry.stage("name_extraction"):
+        name = await extract_name(user_input)
+    with telemetry.stage("contact"):
+        contact = find_contact(user_input)
+    # One session read or write per turn, off the event loop for the SQLite backend.
+    fields = {k: v for k, v in (("name", name), ("contact", contact)) if v}
+    session = await sessions.aupdate(client_key, **fields) if fields else await sessions.aget(client_key)
+    if contact:
         return {
-            "answer": "Got it! Please click **Draft** when you're ready to send."
+            "answer": "Got it! Please click **Draft** when you're ready to send.",
+            "contact": contact
         }
     if re.fullmatch(r"\b(hi|hello|hey|good morning|good afternoon|good evening)\b", user_input, flags=re.I):
-        stored_name = session_memory.get(client_key, {}).get("name")
+        stored_name = session.name
         answer = (
             f"Hello {stored_name}! I'm the Argano assistant. How can I help you today?"
             if stored_name else
             "Hello! I'm the Argano assistant. How can I help you today?"
         )
-        persona_answer=inject_personality(answer,user_input,personality_mode)
-        print(f"\nAgent: Greeting Agent\n")
+        persona_answer=await inject_personality(answer,user_input,personality_mode)
+        telemetry.event("agent", agent="greeting")
         return {
             "answer": persona_answer,
             "word_count": len(answer.split())
@@ -375,13 +366,13 @@ async def ask_api(data: QueryIn, request: Request):
             "answer": f"Nice to meet you, {name}!"
         }
     
-    '''if is_acknowledgment(user_input):
-        stored_name = session_memory.get(client_key, {}).get("name")
+    '''if await is_acknowledgment(user_input):
+        stored_name = sessions.get(client_key).name
         if stored_name:
             answer = f"Great! I'm here to help you, {stored_name}. What would you like to know about Argano's services?"
         else:
             answer = "Great! I'm here to help you. What would you like to know about Argano's services?"
-        persona_answer=inject_personality(answer,user_input,personality_mode)
+        persona_answer=await inject_personality(answer,user_input,personality_mode)
         print(f"\nAgent: Acknowledgment Handler\n")
         return {
                 "answer": persona_answer,
@@ -390,16 +381,29 @@ async def ask_api(data: QueryIn, request: Request):
     '''
    
     
-    relevance_type, top_score = is_relevant_to_company(user_input)
+    with telemetry.stage("retrieval"):
+        retrieval = await retrieve(retriever, embeddings, user_input, k=3)
+    relevance_type, top_score = retrieval.relevance, retrieval.top_score
     
     if relevance_type == 'highly_relevant':
-        rag_resp = company_rag_response(user_input, client_key)
-        rag_answer = rag_resp["answer"]
-        persona_answer=inject_personality(rag_answer,user_input,personality_mode)
-        print(f"\nAgent: RAG Agent\n")
-        rag_resp["answer"]=persona_answer
+        with telemetry.stage("semantic_cache"):
+            cached = semantic_cache.lookup(retrieval.query_embedding, personality_mode) if semantic_cache else None
+        if cached is not None:
+            telemetry.event("agent", agent="rag", semantic_cache_hit=True, top_score=top_score)
+            cached["top_score"] = top_score
+            return cached
+
+        if PERSONA_REWRITE:
+            rag_resp = await company_rag_response(user_input, session.name, retrieval)
+            rag_answer = rag_resp["answer"]
+            rag_resp["answer"] = await inject_personality(rag_answer,user_input,personality_mode)
+        else:
+            rag_resp = await company_rag_response(user_input, session.name, retrieval, personality_mode)
+            rag_answer = rag_resp["answer"]
+        telemetry.event("agent", agent="rag", top_score=top_score)
         rag_resp["word_count"] = len(rag_answer.split())
         rag_resp["top_score"] = top_score
+        cache_rag_answer(user_input, session.name, personality_mode, retrieval, rag_resp)
         
         
         return rag_resp
@@ -410,8 +414,8 @@ async def ask_api(data: QueryIn, request: Request):
             "However, this is something our team can definitely help you with! "
             "Please share your name and contact number, and click **Draft** to get in touch with someone who can assist."
         )
-        persona_answer=inject_personality(answer,user_input,personality_mode)
-        print(f"\nAgent: Out-of-scope Handler (Related)\nAnswer: {answer}\n")
+        persona_answer=await inject_personality(answer,user_input,personality_mode)
+        telemetry.event("agent", agent="out_of_scope_related", top_score=top_score)
         return {
             "answer": persona_answer,
             "top_score": top_score,
@@ -420,7 +424,7 @@ async def ask_api(data: QueryIn, request: Request):
     
     else:
         answer = "I can only answer questions related to our company's services and offerings. How else can I assist you?"
-        print(f"\nAgent: Out-of-scope Handler (Unrelated)\nAnswer: {answer}\n")
+        telemetry.event("agent", agent="out_of_scope_unrelated", top_score=top_score)
         return {
             "answer": answer,
             "top_score": top_score,
@@ -0,0 +1,419 @@
+import os
+import json
+import time
+import logging
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from lexical import LEXICAL_INDEX_FILE, LexicalIndex
+from semantic_cache import read_index_version
+from telemetry import get_logger, log_event
+
+
+VECTOR_SEARCH_WORKERS = int(os.getenv("VECTOR_SEARCH_WORKERS", "4"))
+THRESHOLD_HIGH = 1.1
+THRESHOLD_LOW = 1.7
+
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "chroma")
+HNSW_M = os.getenv("HNSW_M")
+HNSW_CONSTRUCTION_EF = os.getenv("HNSW_CONSTRUCTION_EF")
+HNSW_SEARCH_EF = os.getenv("HNSW_SEARCH_EF")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+VECTOR_MATRIX_DTYPE = os.getenv("VECTOR_MATRIX_DTYPE", "float32")
+VECTORS_FILE = "vectors.npy"
+LEXICAL_SEARCH = os.getenv("LEXICAL_SEARCH", "1") == "1"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+CHUNKS_FILE = "chunks.json"
+
+logger = get_logger("retrieval")
+search_executor = ThreadPoolExecutor(max_workers=VECTOR_SEARCH_WORKERS, thread_name_prefix="vector-search")
+
+
+@dataclass
+class Retrieval:
+    query: str
+    query_embedding: Optional[List[float]] = None
+    results: List[Tuple[Any, float]] = field(default_factory=list)
+    relevance: str = "not_relevant"
+    top_score: Optional[float] = None
+
+
+def relevance_tier(score: Optional[float], threshold_high: float = THRESHOLD_HIGH,
+                   threshold_low: float = THRESHOLD_LOW) -> str:
+    if score is None:
+        return 'not_relevant'
+    try:
+        if score < threshold_low:
+            return 'highly_relevant'
+        elif score < threshold_high:
+            return 'somewhat_relevant'
+        else:
+            return 'not_relevant'
+    except Exception:
+        return 'not_relevant'
+
+
+def hnsw_metadata() -> Dict[str, Any]:
+    # Chroma collection metadata for its HNSW index. M and construction_ef only take effect
+    # when the collection is created (python ingest.py --rebuild); see apply_search_ef().
+    metadata: Dict[str, Any] = {"hnsw:space": "l2"}
+    if HNSW_M:
+        metadata["hnsw:M"] = int(HNSW_M)
+    if HNSW_CONSTRUCTION_EF:
+        metadata["hnsw:construction_ef"] = int(HNSW_CONSTRUCTION_EF)
+    if HNSW_SEARCH_EF:
+        metadata["hnsw:search_ef"] = int(HNSW_SEARCH_EF)
+    return metadata
+
+
+def apply_search_ef(db):
+    # search_ef is the one HNSW parameter an existing collection can change. Only ingest calls
+    # this, so API workers just open the store. hnsw:space has to be left out of the payload:
+    # Chroma rejects any modify() that carries it.
+    if not HNSW_SEARCH_EF:
+        return
+    metadata = dict(db._collection.metadata or {})
+    if metadata.get("hnsw:search_ef") == int(HNSW_SEARCH_EF):
+        return
+    metadata.pop("hnsw:space", None)
+    metadata["hnsw:search_ef"] = int(HNSW_SEARCH_EF)
+    try:
+        db._collection.modify(metadata=metadata)
+        print(f"Set hnsw:search_ef={HNSW_SEARCH_EF}")
+    except Exception as e:
+        print("Could not update hnsw:search_ef:", e)
+
+
+class Retriever(ABC):
+    # search() returns [(Document, score)] best first, where score is a squared L2 distance
+    # (Chroma's default metric) so relevance_tier() thresholds apply to every backend.
+    # distances() scores given chunk IDs the same way from their stored vectors.
+
+    @abstractmethod
+    def search(self, query_embedding: List[float], k: int, query: str = "") -> List[Tuple[Any, float]]:
+        ...
+
+    @abstractmethod
+    def distances(self, ids: List[str], query_embedding: List[float]) -> Dict[str, float]:
+        ...
+
+
+class ChromaRetriever(Retriever):
+    def __init__(self, db):
+        self.db = db
+
+    def search(self, query_embedding: List[float], k: int, query: str = "") -> List[Tuple[Any, float]]:
+        return self.db.similarity_search_by_vector_with_relevance_scores(query_embedding, k=k)
+
+    def distances(self, ids: List[str], query_embedding: List[float]) -> Dict[str, float]:
+        data = self.db.get(ids=list(ids), include=["embeddings"])
+        if not len(data["ids"]):
+            return {}
+        vectors = np.asarray(data["embeddings"], dtype=np.float32).reshape(len(data["ids"]), -1)
+        q = np.asarray(query_embedding, dtype=np.float32)
+        return dict(zip(data["ids"], squared_l2(vectors, np.einsum("ij,ij->i", vectors, vectors), q).tolist()))
+
+
+class VectorSnapshot:
+    def __init__(self, ids: List[str], matrix: np.ndarray, docs: List[Any]):
+        self.ids = ids
+        self.matrix = matrix
+        self.docs = docs
+        self.rows = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+    def rows_for(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        found = [chunk_id for chunk_id in ids if chunk_id in self.rows]
+        return found, np.asarray([self.rows[chunk_id] for chunk_id in found], dtype=np.int64)
+
+    @classmethod
+    def from_chroma(cls, db) -> "VectorSnapshot":
+        from langchain_core.documents import Document
+
+        data = db.get(include=["embeddings", "documents", "metadatas"])
+        docs = [Document(page_content=text or "", metadata=meta or {})
+                for text, meta in zip(data["documents"], data["metadatas"])]
+        if not docs:
+            # First run with no PDFs, or every PDF removed: nothing to reshape, nothing to search.
+            return cls([], np.empty((0, 0), dtype=np.float32), [])
+        matrix = np.asarray(data["embeddings"], dtype=np.float32)
+        return cls(list(data["ids"]), matrix.reshape(len(docs), -1), docs)
+
+    @classmethod
+    def from_export(cls, persist_dir: str) -> "VectorSnapshot":
+        # mmap_mode="r" maps the file read-only, so every worker process shares the same page cache
+        # instead of holding its own copy of the matrix.
+        from langchain_core.documents import Document
+
+        matrix = np.load(os.path.join(persist_dir, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(persist_dir, CHUNKS_FILE)) as f:
+            chunks = json.load(f)
+        docs = [Document(page_content=c["text"], metadata=c["metadata"]) for c in chunks]
+        return cls([c["id"] for c in chunks], matrix, docs)
+
+
+def export_vectors(db, persist_dir: str, dtype: str = VECTOR_MATRIX_DTYPE):
+    # Writes L2-normalised chunk vectors plus their text/metadata next to the Chroma store for
+    # BruteForceRetriever. Both files are replaced atomically so running workers never see half a file.
+    snapshot = VectorSnapshot.from_chroma(db)
+    matrix = snapshot.matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = (matrix / np.where(norms == 0, 1, norms)).astype(dtype)
+
+    vectors_path = os.path.join(persist_dir, VECTORS_FILE)
+    with open(vectors_path + ".tmp", "wb") as f:
+        np.save(f, matrix)
+    chunks_path = os.path.join(persist_dir, CHUNKS_FILE)
+    with open(chunks_path + ".tmp", "w") as f:
+        json.dump([{"id": i, "text": d.page_content, "metadata": d.metadata}
+                   for i, d in zip(snapshot.ids, snapshot.docs)], f)
+    os.replace(chunks_path + ".tmp", chunks_path)
+    os.replace(vectors_path + ".tmp", vectors_path)
+    print(f"Exported {len(snapshot.ids)} {dtype} vectors to {vectors_path}")
+
+
+def squared_l2(matrix: np.ndarray, sq_norms: np.ndarray, query: np.ndarray) -> np.ndarray:
+    return sq_norms - 2.0 * (matrix @ query) + float(query @ query)
+
+
+def top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(distances))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(distances, k - 1)[:k]
+    return idx[np.argsort(distances[idx])]
+
+
+class IVFRetriever(Retriever):
+    # Inverted-file index: k-means coarse quantizer, then exact search inside the nprobe closest lists.
+    # Raising nprobe trades latency for recall; nprobe == nlist is brute force.
+
+    def __init__(self, snapshot: VectorSnapshot, nlist: int = 0, nprobe: int = IVF_NPROBE,
+                 iterations: int = 10, seed: int = 0):
+        self.snapshot = snapshot
+        matrix = snapshot.matrix
+        n = len(matrix)
+        self.nlist = max(1, min(nlist or int(np.sqrt(n)) or 1, n or 1))
+        self.nprobe = max(1, min(nprobe, self.nlist))
+        self.sq_norms = np.einsum("ij,ij->i", matrix, matrix) if n else np.empty(0, dtype=np.float32)
+
+        rng = np.random.default_rng(seed)
+        self.centroids = matrix[rng.choice(n, self.nlist, replace=False)].copy() if n else matrix[:0]
+        assign = np.zeros(n, dtype=np.int64)
+        for _ in range(iterations if n else 0):
+            assign = self._assign(matrix)
+            for c in range(self.nlist):
+                members = matrix[assign == c]
+                if len(members):
+                    self.centroids[c] = members.mean(axis=0)
+        self.lists = [np.flatnonzero(assign == c) for c in range(self.nlist)]
+
+    def _assign(self, matrix: np.ndarray, block: int = 8192) -> np.ndarray:
+        c_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        out = np.empty(len(matrix), dtype=np.int64)
+        for start in range(0, len(matrix), block):
+            part = matrix[start:start + block]
+            out[start:start + block] = np.argmin(c_norms[None, :] - 2.0 * part @ self.centroids.T, axis=1)
+        return out
+
+    def search(self, query_embedding: List[float], k: int, query: str = "") -> List[Tuple[Any, float]]:
+        if not len(self.snapshot.matrix):
+            return []
+        q = np.asarray(query_embedding, dtype=np.float32)
+        c_dist = np.einsum("ij,ij->i", self.centroids, self.centroids) - 2.0 * (self.centroids @ q)
+        probe = top_k(c_dist, self.nprobe)
+        candidates = np.concatenate([self.lists[c] for c in probe])
+        distances = squared_l2(self.snapshot.matrix[candidates], self.sq_norms[candidates], q)
+        best = top_k(distances, k)
+        return [(self.snapshot.docs[candidates[i]], float(distances[i])) for i in best]
+
+    def distances(self, ids: List[str], query_embedding: List[float]) -> Dict[str, float]:
+        found, rows = self.snapshot.rows_for(ids)
+        if not found:
+            return {}
+        q = np.asarray(query_embedding, dtype=np.float32)
+        return dict(zip(found, squared_l2(self.snapshot.matrix[rows], self.sq_norms[rows], q).tolist()))
+
+
+class BruteForceRetriever(Retriever):
+    # Exact search for small corpora: one matrix-vector product over the normalised matrix.
+    # For unit vectors squared L2 is 2 - 2cos, which matches the scores Chroma returns.
+
+    def __init__(self, snapshot: VectorSnapshot):
+        self.snapshot = snapshot
+
+    def _query(self, query_embedding: List[float]) -> np.ndarray:
+        # Match the matrix dtype, or NumPy upcasts a full float32 copy of a float16 matrix per query.
+        q = np.asarray(query_embedding, dtype=np.float32)
+        return (q / (np.linalg.norm(q) or 1.0)).astype(self.snapshot.matrix.dtype)
+
+    def search(self, query_embedding: List[float], k: int, query: str = "") -> List[Tuple[Any, float]]:
+        if not len(self.snapshot.matrix):
+            return []
+        distances = 2.0 - 2.0 * (self.snapshot.matrix @ self._query(query_embedding)).astype(np.float32)
+        return [(self.snapshot.docs[i], float(distances[i])) for i in top_k(distances, k)]
+
+    def distances(self, ids: List[str], query_embedding: List[float]) -> Dict[str, float]:
+        found, rows = self.snapshot.rows_for(ids)
+        if not found:
+            return {}
+        scores = (self.snapshot.matrix[rows] @ self._query(query_embedding)).astype(np.float32)
+        return dict(zip(found, (2.0 - 2.0 * scores).tolist()))
+
+
+def chunk_key(doc) -> str:
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+class HybridRetriever(Retriever):
+    # Fuses vector and BM25 rankings with reciprocal rank fusion, so exact product names and
+    # acronyms that embed poorly still reach the context. Chunks found only lexically are scored
+    # from the vector backend's stored vectors, by chunk ID, so the query path never embeds chunk
+    # text and the score means the same for relevance_tier().
+
+    def __init__(self, vector: Retriever, lexical: LexicalIndex,
+                 candidates: int = HYBRID_CANDIDATES, rrf_k: int = RRF_K):
+        self.vector = vector
+        self.lexical = lexical
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def search(self, query_embedding: List[float], k: int, query: str = "") -> List[Tuple[Any, float]]:
+        from langchain_core.documents import Document
+
+        vector_hits = self.vector.search(query_embedding, max(k, self.candidates), query)
+        lexical_hits = self.lexical.search(query, self.candidates) if query else []
+
+        fused: Dict[str, List[Any]] = {}
+        for rank, (doc, distance) in enumerate(vector_hits):
+            fused[chunk_key(doc)] = [1.0 / (self.rrf_k + rank + 1), doc, distance]
+        for rank, (chunk_id, _) in enumerate(lexical_hits):
+            entry = fused.get(chunk_id)
+            if entry is None:
+                chunk = self.lexical.chunks[chunk_id]
+                entry = fused[chunk_id] = [0.0, Document(page_content=chunk["text"], metadata=chunk["metadata"]), None]
+            entry[0] += 1.0 / (self.rrf_k + rank + 1)
+
+        top = sorted(fused.items(), key=lambda item: item[1][0], reverse=True)[:k]
+        unscored = [chunk_id for chunk_id, entry in top if entry[2] is None]
+        if unscored:
+            stored = self.vector.distances(unscored, query_embedding)
+            if len(stored) < len(unscored):
+                # The lexical index is ahead of the vector store, e.g. while ingest is still writing files.
+                log_event(logger, "lexical_hits_without_vectors", logging.WARNING, missing=len(unscored) - len(stored))
+            for chunk_id in unscored:
+                fused[chunk_id][2] = stored.get(chunk_id)
+        return [(doc, distance) for _, (_, doc, distance) in top if distance is not None]
+
+    def distances(self, ids: List[str], query_embedding: List[float]) -> Dict[str, float]:
+        return self.vector.distances(ids, query_embedding)
+
+
+class ReloadingRetriever(Retriever):
+    # Rebuilds the wrapped retriever when ingest replaces the files it was built from, so running
+    # workers see new and deleted chunks without a restart. The check per query is a few stat() calls;
+    # one search thread rebuilds while the others keep serving the previous index.
+
+    def __init__(self, build: Callable[[], Retriever], signature: Callable[[], Tuple]):
+        self.build = build
+        self.signature = signature
+        self._signature = signature()
+        self.current = build()
+        self._reloading = threading.Lock()
+
+    def _fresh(self) -> Retriever:
+        signature = self.signature()
+        if signature != self._signature and self._reloading.acquire(blocking=False):
+            try:
+                if signature != self._signature:
+                    started = time.perf_counter()
+                    try:
+                        self.current = self.build()
+                        log_event(logger, "retriever_reloaded", index_version=signature[0],
+                                  ms=round((time.perf_counter() - started) * 1000, 1))
+                    except Exception as e:
+                        log_event(logger, "retriever_reload_failed", logging.ERROR, error=str(e))
+                    # Even after a failure, wait for the next ingest rather than rebuilding on every query.
+                    self._signature = signature
+            finally:
+                self._reloading.release()
+        return self.current
+
+    def search(self, query_embedding: List[float], k: int, query: str = "") -> List[Tuple[Any, float]]:
+        return self._fresh().search(query_embedding, k, query)
+
+    def distances(self, ids: List[str], query_embedding: List[float]) -> Dict[str, float]:
+        return self._fresh().distances(ids, query_embedding)
+
+
+def index_signature(persist_dir: str) -> Tuple:
+    # Changes whenever ingest bumps index_version or replaces a file the retrievers load.
+    stamps = []
+    for name in (LEXICAL_INDEX_FILE, VECTORS_FILE, CHUNKS_FILE):
+        try:
+            stamps.append(os.stat(os.path.join(persist_dir, name)).st_mtime_ns)
+        except OSError:
+            stamps.append(None)
+    return (read_index_version(persist_dir), *stamps)
+
+
+def make_retriever(db, backend: str = RETRIEVER_BACKEND, persist_dir: Optional[str] = None) -> Retriever:
+    if not persist_dir:
+        return build_retriever(db, backend)
+    return ReloadingRetriever(lambda: build_retriever(db, backend, persist_dir),
+                              lambda: index_signature(persist_dir))
+
+
+def build_retriever(db, backend: str = RETRIEVER_BACKEND, persist_dir: Optional[str] = None) -> Retriever:
+    if backend == "chroma":
+        retriever = ChromaRetriever(db)
+    elif backend == "numpy":
+        snapshot = VectorSnapshot.from_export(persist_dir)
+        log_event(logger, "vectors_mapped", chunks=len(snapshot.ids), dtype=str(snapshot.matrix.dtype))
+        retriever = BruteForceRetriever(snapshot)
+    elif backend == "ivf":
+        snapshot = VectorSnapshot.from_chroma(db)
+        log_event(logger, "ivf_built", chunks=len(snapshot.ids))
+        retriever = IVFRetriever(snapshot, nlist=IVF_NLIST, nprobe=IVF_NPROBE)
+    else:
+        raise ValueError(f"Unknown RETRIEVER_BACKEND: {backend}")
+
+    if LEXICAL_SEARCH and persist_dir:
+        if LexicalIndex.exists(persist_dir):
+            lexical = LexicalIndex.load(persist_dir)
+            log_event(logger, "lexical_index_loaded", chunks=len(lexical))
+            return HybridRetriever(retriever, lexical)
+        log_event(logger, "lexical_index_missing", logging.WARNING, hint="run python ingest.py to enable hybrid search")
+    return retriever
+
+
+def retrieve_sync(retriever: Retriever, embeddings, query: str, k: int = 3) -> Retrieval:
+    try:
+        vector = embeddings.embed_query(query)
+        results = retriever.search(vector, k, query)
+    except Exception as e:
+        log_event(logger, "similarity_search_failed", logging.ERROR, error=str(e))
+        return Retrieval(query=query)
+
+    # Fused rankings aren't ordered by distance, so take the closest chunk rather than the first.
+    top_score = None
+    if results and isinstance(results[0], tuple) and len(results[0]) == 2:
+        top_score = min(score for _, score in results)
+
+    return Retrieval(
+        query=query,
+        query_embedding=vector,
+        results=results,
+        relevance=relevance_tier(top_score),
+        top_score=top_score,
+    )
+
+
+async def retrieve(retriever: Retriever, embeddings, query: str, k: int = 3) -> Retrieval:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(search_executor, retrieve_sync, retriever, embeddings, query, k)
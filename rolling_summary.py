@@ -0,0 +1,101 @@
+import os
+import asyncio
+import logging
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterable, List, Optional, Set, Tuple
+from conversation_store import ConversationStore
+from telemetry import get_logger, log_event
+
+
+ROLLING_SUMMARY_MIN_TURNS = int(os.getenv("ROLLING_SUMMARY_MIN_TURNS", "4"))
+
+ROLE_LABELS = {"user": "User", "assistant": "Assistant"}
+FOLD_LOCK_STRIPES = 64
+
+logger = get_logger("rolling_summary")
+
+
+def format_turns(turns: Iterable[Tuple[int, str, str]]) -> str:
+    return "\n".join(f"{ROLE_LABELS.get(role, role)}: {text}" for _, role, text in turns)
+
+
+def build_fold_prompt(summary: str, turns: List[Tuple[int, str, str]]) -> str:
+    if not summary:
+        return (
+            "Summarize the following chat conversation in 4–5 clear sentences. "
+            "If any email is mentioned, include it.\n\n"
+            f"{format_turns(turns)}\n"
+        )
+    return (
+        "Here is a summary of a chat conversation so far, followed by the newest messages. "
+        "Rewrite the summary in 4–5 clear sentences so it also covers the new messages. "
+        "Keep every email address, name and contact detail mentioned so far.\n\n"
+        f"Summary so far:\n{summary}\n\n"
+        f"New messages:\n{format_turns(turns)}\n"
+    )
+
+
+class RollingSummarizer:
+    # Folds new turns into the session's summary checkpoint. `complete` is an async prompt -> text
+    # call, so the LangChain chat service and the LlamaIndex mail service can share this.
+
+    def __init__(self, store: ConversationStore, complete: Callable[[str], Awaitable[str]],
+                 min_turns: int = ROLLING_SUMMARY_MIN_TURNS):
+        self.store = store
+        self.complete = complete
+        self.min_turns = min_turns
+        # Striped locks: one fold per session at a time without keeping a lock per session forever.
+        self._locks = [asyncio.Lock() for _ in range(FOLD_LOCK_STRIPES)]
+        self._tasks: Set[asyncio.Task] = set()
+        # SQLite calls can wait on other writers for seconds, so they never run on the event loop.
+        # One thread keeps them in submission order: a fold always sees the turns recorded before it.
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-store")
+
+    def _run_db(self, fn, *args) -> "asyncio.Future":
+        return asyncio.get_running_loop().run_in_executor(self._db, fn, *args)
+
+    async def last_turn_id(self, session: str) -> int:
+        return await self._run_db(self.store.last_turn_id, session)
+
+    async def turns(self, session: str, after_id: int = 0) -> List[Tuple[int, str, str]]:
+        return await self._run_db(self.store.turns_since, session, after_id)
+
+    async def checkpoint(self, session: str) -> Tuple[str, List[Tuple[int, str, str]]]:
+        # The stored summary and the turns logged since it was written.
+        summary, through_id = await self._run_db(self.store.get_summary, session)
+        return summary, await self.turns(session, through_id)
+
+    async def fold(self, session: str, min_turns: int = 1) -> Tuple[str, List[Tuple[int, str, str]]]:
+        # Returns the up-to-date summary and the turns it just absorbed.
+        async with self._locks[zlib.crc32(session.encode("utf-8")) % FOLD_LOCK_STRIPES]:
+            summary, through_id = await self._run_db(self.store.get_summary, session)
+            turns = await self._run_db(self.store.turns_since, session, through_id)
+            if len(turns) < min_turns:
+                return summary, []
+            text = (await self.complete(build_fold_prompt(summary, turns))).strip()
+            if text:
+                await self._run_db(self.store.save_summary, session, text, turns[-1][0])
+                summary = text
+        return summary, turns
+
+    def _append_turn(self, session: str, user_text: str, answer: Optional[str]):
+        self.store.append(session, "user", user_text)
+        if answer:
+            self.store.append(session, "assistant", answer)
+
+    def record_turn(self, session: Optional[str], user_text: str, answer: Optional[str]):
+        # Returns at once; the write and the fold both happen in the background.
+        if not session:
+            return
+        written = self._run_db(self._append_turn, session, user_text, answer)
+        task = asyncio.get_running_loop().create_task(self._fold_in_background(session, written))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold_in_background(self, session: str, written: "asyncio.Future"):
+        try:
+            await written
+            await self.fold(session, self.min_turns)
+        except Exception as e:
+            log_event(logger, "rolling_summary_failed", logging.ERROR, session=session, error=str(e))
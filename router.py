@@ -0,0 +1,101 @@
+import json
+import logging
+from typing import Literal, Optional
+from pydantic import BaseModel, ValidationError
+from telemetry import get_logger, log_event
+
+
+logger = get_logger("router")
+
+Intent = Literal["GREETING_ONLY", "ACKNOWLEDGE_ONLY", "QUESTION"]
+
+
+class RouteResult(BaseModel):
+    name: Optional[str] = None
+    intent: Intent = "QUESTION"
+    response_text: Optional[str] = None
+
+
+FALLBACK_ROUTE = RouteResult()
+
+
+def build_router_prompt(user_input: str, stored_name: Optional[str] = None, persona_instructions: str = "") -> str:
+    return f"""Analyze the user's message for a company receptionist chatbot.
+User Input: "{user_input}"
+Context: User Name is "{stored_name}" if known.
+
+Do ALL of the following in one pass:
+
+1. name: Extract the person's name ONLY if the user states their own real name
+   (e.g. "my name is John" -> "John", "I'm Sarah" -> "Sarah", "call me Mike" -> "Mike",
+   "my name is Sasank and i want to know about aws" -> "Sasank"). Capitalize it.
+   Use null if no name is mentioned.
+
+2. intent: Classify into ONE category:
+   - ACKNOWLEDGE_ONLY: an acknowledgment, confirmation, agreement or compliment with no
+     question (okay, got it, thanks, understood, nice, good, impressive, cool, etc).
+   - GREETING_ONLY: the user is ONLY greeting ("Hello", "Hi", "Hey", "Wassup") or only
+     identifying themselves. No questions asked.
+   - QUESTION: the user is asking for information, even if they say hi or give their
+     name first (e.g. "Hi, what is AWS?", "Tell me about services").
+
+3. response_text:
+   - ACKNOWLEDGE_ONLY: a brief reply (1-2 sentences) saying you're here to help and
+     asking what they need.
+   - GREETING_ONLY: a warm greeting; if they just identified themselves greet them by
+     name (nice to meet you) but don't offer any services.
+   - QUESTION: null.
+{persona_instructions}
+Output ONLY JSON in this format:
+{{
+    "name": "the name or null",
+    "intent": "GREETING_ONLY" | "ACKNOWLEDGE_ONLY" | "QUESTION",
+    "response_text": "your generated response, or null for QUESTION"
+}}"""
+
+
+def strip_code_fence(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split('\n', 1)[1] if '\n' in text else ""
+    if text.endswith("```"):
+        text = text.rsplit('\n', 1)[0] if '\n' in text else ""
+    return text.strip()
+
+
+def parse_route(text: str) -> RouteResult:
+    try:
+        data = json.loads(strip_code_fence(text))
+        result = RouteResult.model_validate(data)
+    except (ValueError, ValidationError, TypeError) as e:
+        log_event(logger, "router_parse_failed", logging.WARNING, error=str(e))
+        return FALLBACK_ROUTE
+
+    name = (result.name or "").strip()
+    if not name or name.upper() in ("NONE", "NULL"):
+        name = None
+    else:
+        name = name.capitalize()
+
+    response_text = result.response_text
+    if result.intent != "QUESTION" and not response_text:
+        # A canned intent without a reply cannot be answered; let RAG handle it.
+        return RouteResult(name=name)
+
+    return RouteResult(
+        name=name,
+        intent=result.intent,
+        response_text=response_text if result.intent != "QUESTION" else None,
+    )
+
+
+async def route_message(llm, user_input: str, stored_name: Optional[str] = None,
+                        persona_instructions: str = "") -> RouteResult:
+    prompt = build_router_prompt(user_input, stored_name, persona_instructions)
+    try:
+        response = await llm.ainvoke(prompt)
+        text = getattr(response, "content", None) or str(response)
+    except Exception as e:
+        log_event(logger, "router_failed", logging.ERROR, error=str(e))
+        return FALLBACK_ROUTE
+    return parse_route(text)
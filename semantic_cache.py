@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from telemetry import get_logger, log_event
+
+
+logger = get_logger("semantic_cache")
+
+
+INDEX_VERSION_FILE = "index_version"
+
+
+def write_index_version(persist_dir: str) -> str:
+    version = uuid.uuid4().hex
+    with open(os.path.join(persist_dir, INDEX_VERSION_FILE), "w") as f:
+        f.write(version)
+    return version
+
+
+def read_index_version(persist_dir: str) -> str:
+    try:
+        with open(os.path.join(persist_dir, INDEX_VERSION_FILE)) as f:
+            return f.read().strip() or "unversioned"
+    except OSError:
+        return "unversioned"
+
+
+@dataclass
+class CacheEntry:
+    entry_id: str
+    query: str
+    embedding: np.ndarray
+    personality_mode: str
+    chunk_ids: List[str]
+    payload: Dict[str, Any]
+    created_at: float
+
+
+def _normalize(vector) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 86400, max_entries: int = 1000,
+                 path: Optional[str] = None, index_version: Optional[Callable[[], str]] = None):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path = path
+        self.index_version = index_version or (lambda: "unversioned")
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._version = self.index_version()
+        if path:
+            self._open_store()
+
+    def _open_store(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache ("
+            "entry_id TEXT PRIMARY KEY, query TEXT, embedding BLOB, personality_mode TEXT, "
+            "chunk_ids TEXT, payload TEXT, created_at REAL, index_version TEXT)"
+        )
+        self._conn.execute("DELETE FROM semantic_cache WHERE index_version != ? OR created_at < ?",
+                           (self._version, time.time() - self.ttl_seconds))
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT entry_id, query, embedding, personality_mode, chunk_ids, payload, created_at "
+            "FROM semantic_cache ORDER BY created_at"
+        ).fetchall()
+        for entry_id, query, blob, mode, chunk_ids, payload, created_at in rows[-self.max_entries:]:
+            self.entries[entry_id] = CacheEntry(
+                entry_id, query, np.frombuffer(blob, dtype=np.float32).copy(), mode,
+                json.loads(chunk_ids), json.loads(payload), created_at,
+            )
+
+    def _check_version(self):
+        version = self.index_version()
+        if version != self._version:
+            log_event(logger, "semantic_cache_invalidated", old_version=self._version, new_version=version)
+            self._version = version
+            self._clear()
+
+    def _clear(self):
+        self.entries.clear()
+        if self._conn:
+            self._conn.execute("DELETE FROM semantic_cache")
+            self._conn.commit()
+
+    def _delete(self, entry_ids: List[str]):
+        for entry_id in entry_ids:
+            self.entries.pop(entry_id, None)
+        if self._conn and entry_ids:
+            self._conn.executemany("DELETE FROM semantic_cache WHERE entry_id = ?", [(e,) for e in entry_ids])
+            self._conn.commit()
+
+    def lookup(self, query_embedding, personality_mode: str = "normal") -> Optional[Dict[str, Any]]:
+        if query_embedding is None:
+            return None
+        with self._lock:
+            self._check_version()
+            now = time.time()
+            expired = [e.entry_id for e in self.entries.values() if now - e.created_at > self.ttl_seconds]
+            self._delete(expired)
+
+            candidates = [e for e in self.entries.values() if e.personality_mode == personality_mode]
+            if not candidates:
+                self.misses += 1
+                return None
+
+            matrix = np.stack([e.embedding for e in candidates])
+            sims = matrix @ _normalize(query_embedding)
+            best = int(np.argmax(sims))
+            if float(sims[best]) < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = candidates[best]
+            self.entries.move_to_end(entry.entry_id)
+            self.hits += 1
+            payload = dict(entry.payload)
+            payload["cache_similarity"] = float(sims[best])
+            return payload
+
+    def store(self, query: str, query_embedding, personality_mode: str, chunk_ids: List[str], payload: Dict[str, Any]):
+        if query_embedding is None:
+            return
+        with self._lock:
+            self._check_version()
+            entry = CacheEntry(uuid.uuid4().hex, query, _normalize(query_embedding), personality_mode,
+                               list(chunk_ids), dict(payload), time.time())
+            self.entries[entry.entry_id] = entry
+            overflow = len(self.entries) - self.max_entries
+            if overflow > 0:
+                self._delete(list(self.entries.keys())[:overflow])
+            if self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO semantic_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (entry.entry_id, query, entry.embedding.tobytes(), personality_mode,
+                     json.dumps(entry.chunk_ids), json.dumps(entry.payload, default=str),
+                     entry.created_at, self._version),
+                )
+                self._conn.commit()
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
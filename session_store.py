@@ -0,0 +1,188 @@
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "./sessions.sqlite3")
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+SESSION_FIELDS = ("name", "contact")
+
+
+class SessionRecord:
+    __slots__ = ("name", "contact", "updated_at")
+
+    def __init__(self, name: Optional[str] = None, contact: Optional[str] = None, updated_at: float = 0.0):
+        self.name = name
+        self.contact = contact
+        self.updated_at = updated_at
+
+    def as_dict(self) -> Dict[str, Optional[str]]:
+        return {"name": self.name, "contact": self.contact}
+
+
+class SessionStore(ABC):
+    # get() always returns a record (an empty one for unknown sessions); update() creates or refreshes it.
+    # Request handlers use aget()/aupdate(), which only leave the event loop for stores that can block.
+
+    @abstractmethod
+    def get(self, key: str) -> SessionRecord:
+        ...
+
+    @abstractmethod
+    def update(self, key: str, **fields) -> SessionRecord:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    async def aget(self, key: str) -> SessionRecord:
+        return self.get(key)
+
+    async def aupdate(self, key: str, **fields) -> SessionRecord:
+        return self.update(key, **fields)
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, max_entries: int = SESSION_MAX_ENTRIES, ttl_seconds: float = SESSION_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._records: "OrderedDict[str, SessionRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> SessionRecord:
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                return SessionRecord()
+            if time.time() - record.updated_at > self.ttl_seconds:
+                del self._records[key]
+                return SessionRecord()
+            self._records.move_to_end(key)
+            return record
+
+    def update(self, key: str, **fields) -> SessionRecord:
+        with self._lock:
+            record = self._records.get(key)
+            if record is None or time.time() - record.updated_at > self.ttl_seconds:
+                record = SessionRecord()
+                self._records[key] = record
+            for field, value in fields.items():
+                setattr(record, field, value)
+            record.updated_at = time.time()
+            self._records.move_to_end(key)
+            while len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+            return record
+
+    def delete(self, key: str):
+        with self._lock:
+            self._records.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+class SQLiteSessionStore(SessionStore):
+    # Shared by every worker process on the host, so a session survives the load balancer
+    # picking a different worker.
+
+    def __init__(self, path: str = SESSION_DB_PATH, ttl_seconds: float = SESSION_TTL,
+                 max_entries: int = SESSION_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "key TEXT PRIMARY KEY, name TEXT, contact TEXT, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self._conn.commit()
+        # Commits can wait up to the busy timeout on other workers, so async callers never run them on
+        # the event loop. Calls share one connection and lock anyway, so one thread is enough.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-store")
+
+    def get(self, key: str) -> SessionRecord:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, contact, updated_at FROM sessions WHERE key = ? AND updated_at >= ?",
+                (key, time.time() - self.ttl_seconds),
+            ).fetchone()
+        return SessionRecord(*row) if row else SessionRecord()
+
+    def update(self, key: str, **fields) -> SessionRecord:
+        # One upsert, so concurrent workers setting different fields never overwrite each other.
+        # Fields not being set are kept, unless the stored record has already expired.
+        unknown = set(fields) - set(SESSION_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown session fields: {sorted(unknown)}")
+        now = time.time()
+        assignments = []
+        params = [key, *(fields.get(f) for f in SESSION_FIELDS), now]
+        for f in SESSION_FIELDS:
+            if f in fields:
+                assignments.append(f"{f} = excluded.{f}")
+            else:
+                assignments.append(f"{f} = CASE WHEN sessions.updated_at < ? THEN NULL ELSE sessions.{f} END")
+                params.append(now - self.ttl_seconds)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (key, name, contact, updated_at) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT(key) DO UPDATE SET {', '.join(assignments)}, updated_at = excluded.updated_at",
+                params,
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict()
+            self._conn.commit()
+            row = self._conn.execute(
+                "SELECT name, contact, updated_at FROM sessions WHERE key = ?", (key,)
+            ).fetchone()
+        return SessionRecord(*row) if row else SessionRecord(**fields, updated_at=now)
+
+    async def aget(self, key: str) -> SessionRecord:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.get, key)
+
+    async def aupdate(self, key: str, **fields) -> SessionRecord:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, lambda: self.update(key, **fields))
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM sessions WHERE key NOT IN "
+            "(SELECT key FROM sessions ORDER BY updated_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def make_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    return MemorySessionStore()
@@ -61,17 +61,21 @@ const Chatbot = () => {
     //   setUserName(nameMatch[1]);
     // }
 
-    const contactPattern = /(\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b|(?:\+?1?\d{9,15}))/;
-    const contactMatch = input.match(contactPattern);
-    if (contactMatch) {
-      setUserContact(contactMatch[0]);
-    }
-
     const query = input;
     setInput("");
 
+    const botMode = personalityMode;
+    const botId = `bot_${Date.now()}_${Math.random()}`;
+    let receivedText = false;
+    const appendBotText = (text) => {
+      receivedText = true;
+      setMessages(prev => prev.some(m => m.id === botId)
+        ? prev.map(m => (m.id === botId ? { ...m, text: m.text + text } : m))
+        : [...prev, { id: botId, from: "bot", text, agentMode: botMode }]);
+    };
+
     try {
-      const response = await fetch("http://localhost:8000/ask", {
+      const response = await fetch("http://localhost:8000/ask/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ 
@@ -80,13 +84,46 @@ const Chatbot = () => {
           personality_mode: personalityMode
         })
       });
+      if (!response.ok || !response.body) {
+        throw new Error(`HTTP ${response.status}`);
+      }
 
-      const data = await response.json();
-      const data = await response.json();
-      if(data.name){
-        setUserName(data.name)
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      const handleEvent = (rawEvent) => {
+        let event = "message";
+        let data = "";
+        rawEvent.split("\n").forEach(line => {
+          if (line.startsWith("event:")) event = line.slice(6).trim();
+          else if (line.startsWith("data:")) data += line.slice(5).trim();
+        });
+        if (!data) return;
+        const payload = JSON.parse(data);
+        if (event === "token") {
+          setIsBotTyping(false);
+          appendBotText(payload.text);
+        } else if (event === "done") {
+          // Name and contact detection happens server-side; the client only mirrors it.
+          if (payload.name) setUserName(payload.name);
+          if (payload.contact) setUserContact(payload.contact);
+        } else if (event === "error" && !receivedText) {
+          appendBotText("Error: LLM invocation failed.");
+        }
+      };
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) !== -1) {
+          handleEvent(buffer.slice(0, sep));
+          buffer = buffer.slice(sep + 2);
+        }
       }
-      setMessages(prev => [...prev, { from: "bot", text: data.answer, agentMode: data.agent_mode || personalityMode }]);
+      if (buffer.trim()) handleEvent(buffer);
     } catch (error) {
       setMessages(prev => [...prev, {
         from: "bot",
@@ -104,14 +141,23 @@ const Chatbot = () => {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ 
-          messages: messages.map(m => m.text),
+          session_id: sessionId,
           user_name: userName || null,
           user_contact: userContact || null
         })
       });
-
-      const data = await response.json();
-      const emailText = data.email;
+      let job = await response.json();
+
+      // The draft is generated as a background job; poll until it finishes.
+      const deadline = Date.now() + 120000;
+      while (job.status === "queued" || job.status === "running") {
+        if (Date.now() > deadline) throw new Error("Draft timed out");
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const poll = await fetch(`http://localhost:8081/jobs/${job.job_id}`);
+        job = await poll.json();
+      }
+      if (job.status !== "done") throw new Error(job.error || "Draft failed");
+      const emailText = job.result.email;
 
       const subjectMatch = emailText.match(/Subject:\s*(.*)/);
       const toMatch = emailText.match(/To:\s*(.*)/);
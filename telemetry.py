@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import random
+import asyncio
+import functools
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_listener: Optional[QueueListener] = None
+_log_queue: "queue.Queue" = queue.Queue(-1)
+_listener_lock = threading.Lock()
+
+# The trace of the request being served; set once per request task and never shared across requests.
+current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "service": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str)
+
+
+def get_logger(service: str) -> logging.Logger:
+    # Records go through a queue to one background writer thread, so request handlers never
+    # block on stdout.
+    global _listener
+    logger = logging.getLogger(service)
+    with _listener_lock:
+        if _listener is None:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(JsonFormatter())
+            _listener = QueueListener(_log_queue, handler)
+            _listener.start()
+        if not logger.handlers:
+            logger.addHandler(QueueHandler(_log_queue))
+            logger.setLevel(LOG_LEVEL)
+            logger.propagate = False
+    return logger
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields):
+    # Routine events are dropped for requests that weren't sampled; warnings and errors never are.
+    trace = current_trace.get()
+    if trace is not None:
+        if not trace.sampled and level < logging.WARNING:
+            return
+        fields["trace_id"] = trace.trace_id
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Trace:
+    __slots__ = ("trace_id", "endpoint", "sampled", "started", "stages")
+
+    def __init__(self, endpoint: str, sampled: bool):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.endpoint = endpoint
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+
+class Telemetry:
+    # Per-stage latency histograms (always recorded), Prometheus text rendering, and JSON logs.
+    # LOG_SAMPLE_RATE decides per request whether its routine events are logged; errors always are.
+
+    def __init__(self, service: str, ledger=None, sample_rate: float = LOG_SAMPLE_RATE):
+        self.service = service
+        self.ledger = ledger
+        self.sample_rate = sample_rate
+        self.logger = get_logger(service)
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint: str, stage: str, seconds: float):
+        with self._lock:
+            histogram = self.histograms.get((endpoint, stage))
+            if histogram is None:
+                histogram = self.histograms[(endpoint, stage)] = Histogram()
+            histogram.observe(seconds)
+
+    def start_trace(self, endpoint: str) -> Trace:
+        trace = Trace(endpoint, random.random() < self.sample_rate)
+        current_trace.set(trace)
+        return trace
+
+    def finish_trace(self, trace: Trace, **fields):
+        elapsed = time.perf_counter() - trace.started
+        self.observe(trace.endpoint, "total", elapsed)
+        self.event("request", endpoint=trace.endpoint, total_ms=round(elapsed * 1000, 1),
+                   stages_ms={k: round(v * 1000, 1) for k, v in trace.stages.items()}, **fields)
+
+    @contextmanager
+    def stage(self, name: str):
+        trace = current_trace.get()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(trace.endpoint if trace else "none", name, elapsed)
+            if trace is not None:
+                trace.stages[name] = trace.stages.get(name, 0.0) + elapsed
+
+    def traced(self, endpoint: str):
+        # Wraps a FastAPI handler so the whole request is timed and logged as one trace.
+        def decorator(fn):
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def wrapper(*args, **kwargs):
+                    trace = self.start_trace(endpoint)
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        self.finish_trace(trace)
+            else:
+                @functools.wraps(fn)
+                def wrapper(*args, **kwargs):
+                    trace = self.start_trace(endpoint)
+                    try:
+                        return fn(*args, **kwargs)
+                    finally:
+                        self.finish_trace(trace)
+            return wrapper
+        return decorator
+
+    def event(self, event: str, level: int = logging.INFO, **fields):
+        log_event(self.logger, event, level, **fields)
+
+    def error(self, event: str, **fields):
+        self.event(event, level=logging.ERROR, **fields)
+
+    def render_metrics(self) -> str:
+        lines: List[str] = [
+            "# HELP stage_latency_seconds Latency of each request stage.",
+            "# TYPE stage_latency_seconds histogram",
+        ]
+        with self._lock:
+            for (endpoint, stage), h in sorted(self.histograms.items()):
+                labels = f'service="{self.service}",endpoint="{endpoint}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'stage_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'stage_latency_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"stage_latency_seconds_sum{{{labels}}} {h.sum:.6f}")
+                lines.append(f"stage_latency_seconds_count{{{labels}}} {h.count}")
+
+        if self.ledger is not None:
+            stats = self.ledger.stats()
+            for label, groups in (("agent", stats["by_agent"]), ("endpoint", stats["by_endpoint"])):
+                metric = f"llm_tokens_by_{label}_total"
+                lines += [f"# HELP {metric} LLM tokens spent, by {label}.", f"# TYPE {metric} counter"]
+                for name, counters in sorted(groups.items()):
+                    for kind in ("prompt", "completion"):
+                        lines.append(f'{metric}{{service="{self.service}",{label}="{name}",kind="{kind}"}} '
+                                     f'{counters[kind + "_tokens"]}')
+        return "\n".join(lines) + "\n"
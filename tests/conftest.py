@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import importlib
+import pytest
+
+# The services are flat top-level modules; make them importable and keep every SQLite file the
+# modules open by default out of the working tree.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+_scratch = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ.setdefault("CONVERSATION_DB_PATH", os.path.join(_scratch, "conversations.sqlite3"))
+os.environ.setdefault("SESSION_DB_PATH", os.path.join(_scratch, "sessions.sqlite3"))
+os.environ.setdefault("EMBED_CACHE_PATH", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Only lets the services construct their LLM clients; tests swap in stub models before any call.
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+
+
+class StubChroma:
+    # Opens nothing on disk; tests that search install their own retriever.
+
+    def __init__(self, *args, **kwargs):
+        self.kwargs = kwargs
+
+
+def import_chat_service(monkeypatch):
+    # Imports multiagent.py as a worker would, with Chroma stubbed out. It still needs ./db to exist.
+    pytest.importorskip("langchain.chat_models")
+    vectorstores = pytest.importorskip("langchain_community.vectorstores")
+    monkeypatch.setattr(vectorstores, "Chroma", StubChroma)
+    sys.modules.pop("multiagent", None)
+    return importlib.import_module("multiagent")
+
+
+@pytest.fixture(scope="session")
+def chat_service():
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(REPO_ROOT)
+        return import_chat_service(mp)
+
+
+@pytest.fixture
+def fresh_chat_service(monkeypatch):
+    # Re-imports multiagent from the current directory each call, for tests that time or vary startup.
+    return lambda: import_chat_service(monkeypatch)
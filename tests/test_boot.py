@@ -0,0 +1,33 @@
+import time
+import statistics
+
+PDF_COUNTS = (0, 50, 400)
+IMPORTS = 3
+
+
+def fake_corpus(root, pdfs: int):
+    # A persisted store next to a PDF folder. The PDFs are not even parseable: startup must not open them.
+    (root / "db").mkdir(parents=True)
+    (root / "sample_files").mkdir()
+    for i in range(pdfs):
+        (root / "sample_files" / f"brochure_{i}.pdf").write_bytes(b"%PDF-1.4\n" + b"x" * 64 * 1024)
+
+
+def test_boot_time_does_not_depend_on_pdf_count(fresh_chat_service, tmp_path, monkeypatch):
+    boot_ms = {}
+    for pdfs in PDF_COUNTS:
+        root = tmp_path / f"corpus_{pdfs}"
+        fake_corpus(root, pdfs)
+        monkeypatch.chdir(root)
+        times = []
+        for _ in range(IMPORTS):
+            started = time.perf_counter()
+            service = fresh_chat_service()
+            times.append(time.perf_counter() - started)
+            assert service.PERSIST_DIR == "./db"
+        boot_ms[pdfs] = statistics.median(times) * 1000
+
+    print("\npdfs  boot ms")
+    for pdfs, ms in boot_ms.items():
+        print(f"{pdfs:4d}  {ms:7.1f}")
+    assert boot_ms[PDF_COUNTS[-1]] < 1.5 * boot_ms[PDF_COUNTS[0]] + 20
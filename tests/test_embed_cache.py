@@ -0,0 +1,42 @@
+import time
+from embed_cache import CachedEmbeddings, EmbeddingStore, text_sha256
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 1.0]
+
+
+def test_query_vectors_are_bounded(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embed.sqlite3"), max_queries=50)
+    embeddings = CachedEmbeddings(CountingEmbeddings(), "model", store, lru_size=10)
+    embeddings.embed_documents([f"chunk {i}" for i in range(20)])
+    for i in range(1000):
+        embeddings.embed_query(f"query {i}")
+
+    assert store.query_count() <= 50 + 99
+    assert store.get_many("model", [text_sha256("query 999")]) == {}
+    # Chunk vectors are never pruned by query traffic.
+    assert CachedEmbeddings(CountingEmbeddings(), "model", store).embed_documents(["chunk 0"]) == [[7.0, 1.0]]
+
+
+def test_query_vectors_are_shared_until_they_expire(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embed.sqlite3"), query_ttl=0.2)
+    CachedEmbeddings(CountingEmbeddings(), "model", store).embed_query("what is erp?")
+
+    other_worker = CountingEmbeddings()
+    CachedEmbeddings(other_worker, "model", store).embed_query("what is erp?")
+    assert other_worker.calls == 0
+
+    time.sleep(0.25)
+    late_worker = CountingEmbeddings()
+    CachedEmbeddings(late_worker, "model", store).embed_query("what is erp?")
+    assert late_worker.calls == 1
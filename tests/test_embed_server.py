@@ -0,0 +1,82 @@
+import time
+import asyncio
+from embed_server import MicroBatcher
+
+
+class RecordingEmbeddings:
+    # Blocking like the real model, and records the size of every batch it is given.
+
+    def __init__(self, latency: float = 0.01):
+        self.latency = latency
+        self.batches = []
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        if "boom" in texts:
+            raise RuntimeError("model crashed")
+        self.batches.append(len(texts))
+        return [[float(len(t)), float(i)] for i, t in enumerate(texts)]
+
+
+async def with_batcher(embeddings, scenario, **kwargs):
+    batcher = MicroBatcher(embeddings, **kwargs)
+    runner = asyncio.create_task(batcher.run())
+    try:
+        return batcher, await scenario(batcher)
+    finally:
+        runner.cancel()
+
+
+def test_concurrent_requests_share_batches():
+    embeddings = RecordingEmbeddings()
+    requests = [[f"text {n}-{i}" for i in range(n % 3 + 1)] for n in range(40)]
+
+    async def scenario(batcher):
+        return await asyncio.gather(*(batcher.embed(texts) for texts in requests))
+
+    batcher, results = asyncio.run(with_batcher(embeddings, scenario, max_batch=16, wait_ms=20))
+    for texts, vectors in zip(requests, results):
+        assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    total = sum(len(texts) for texts in requests)
+    assert (batcher.texts, sum(embeddings.batches)) == (total, total)
+    assert batcher.batches == len(embeddings.batches) < len(requests) / 4
+    # A request is never split, so a batch only overshoots by less than one request.
+    assert max(embeddings.batches) < 16 + 3
+
+
+def test_single_texts_never_exceed_max_batch():
+    embeddings = RecordingEmbeddings()
+
+    async def scenario(batcher):
+        return await asyncio.gather(*(batcher.embed([f"q{i}"]) for i in range(50)))
+
+    asyncio.run(with_batcher(embeddings, scenario, max_batch=8, wait_ms=20))
+    assert max(embeddings.batches) <= 8 and sum(embeddings.batches) == 50
+
+
+def test_lone_request_waits_at_most_the_batch_window():
+    async def scenario(batcher):
+        started = time.perf_counter()
+        await batcher.embed(["hello"])
+        return time.perf_counter() - started
+
+    _, waited = asyncio.run(with_batcher(RecordingEmbeddings(latency=0), scenario, max_batch=64, wait_ms=30))
+    assert 0.025 < waited < 0.2
+
+
+def test_model_failure_fails_its_batch_and_keeps_serving():
+    async def scenario(batcher):
+        failed = await asyncio.gather(batcher.embed(["boom"]), batcher.embed(["ok"]), return_exceptions=True)
+        return failed, await batcher.embed(["after"])
+
+    _, (failed, after) = asyncio.run(with_batcher(RecordingEmbeddings(), scenario, wait_ms=20))
+    assert all(isinstance(r, RuntimeError) for r in failed)
+    assert after == [[5.0, 0.0]]
+
+
+def test_empty_request_resolves():
+    async def scenario(batcher):
+        return await asyncio.wait_for(batcher.embed([]), 1)
+
+    _, vectors = asyncio.run(with_batcher(RecordingEmbeddings(), scenario, wait_ms=5))
+    assert vectors == []
@@ -0,0 +1,85 @@
+import json
+import time
+import asyncio
+from llm_cache import CachingLLM
+from retrieval import Retriever, retrieve
+from router import route_message
+
+LLM_LATENCY = 0.05
+SEARCH_LATENCY = 0.01
+REQUESTS = 32
+
+
+class SlowLLM:
+    # Stub chat model with network-like latency that only awaits, like a real async client.
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(LLM_LATENCY)
+        reply = json.dumps({"name": None, "intent": "QUESTION", "response_text": None})
+        return type("Message", (), {"content": reply})()
+
+
+class SlowRetriever(Retriever):
+    # Blocking search, like Chroma's: it must run on the executor, never on the event loop.
+
+    def __init__(self, latency: float = SEARCH_LATENCY):
+        self.latency = latency
+
+    def search(self, query_embedding, k, query=""):
+        time.sleep(self.latency)
+        return [(query, 0.5)]
+
+    def distances(self, ids, query_embedding):
+        return {}
+
+
+class StubEmbeddings:
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+async def turn(llm, retriever, n: int):
+    route = await route_message(llm, f"question number {n}")
+    assert route.intent == "QUESTION"
+    return await retrieve(retriever, StubEmbeddings(), f"question number {n}")
+
+
+async def throughput(in_flight: int) -> float:
+    llm = CachingLLM(SlowLLM())
+    retriever = SlowRetriever()
+    slots = asyncio.Semaphore(in_flight)
+
+    async def one(n):
+        async with slots:
+            await turn(llm, retriever, n)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(REQUESTS)))
+    return REQUESTS / (time.perf_counter() - started)
+
+
+def test_throughput_grows_with_in_flight_requests():
+    rates = {n: asyncio.run(throughput(n)) for n in (1, 4, 16)}
+    print("\nin-flight  req/s")
+    for n, rate in rates.items():
+        print(f"{n:9d}  {rate:6.1f}")
+    assert rates[1] < rates[4] < rates[16]
+    assert rates[16] > 4 * rates[1]
+
+
+def test_blocking_search_does_not_stall_the_event_loop():
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await retrieve(SlowRetriever(latency=0.2), StubEmbeddings(), "hello")
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 10
@@ -0,0 +1,99 @@
+import time
+import asyncio
+import pytest
+
+pytest.importorskip("llama_index.llms.google_genai")
+import mailAPI  # noqa: E402
+
+LLM_LATENCY = 0.2
+TRANSCRIPT = "User: hi my name is Priya\nAssistant: Hello!\nUser: we want to move our ERP to AWS, mail priya@x.com"
+
+
+class SlowLLM:
+    # Stub LlamaIndex model: fixed latency per completion, like one Gemini round trip.
+
+    def __init__(self):
+        self.calls = 0
+
+    async def acomplete(self, prompt, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(LLM_LATENCY)
+        text = "Cloud Migration, ERP" if "topics" in prompt else "Priya wants to move their ERP to AWS."
+        return type("Completion", (), {"text": text})()
+
+
+async def serial_run(text):
+    # The pre-change pipeline: summary first, then topics.
+    summary = await mailAPI.summarize_conversation(text)
+    topics = await mailAPI.detect_topics_llm(text)
+    return mailAPI.compose_draft(text, summary, topics)
+
+
+def timed(coro_fn):
+    started = time.perf_counter()
+    result = asyncio.run(coro_fn(TRANSCRIPT))
+    return result, time.perf_counter() - started
+
+
+def test_concurrent_draft_beats_serial(monkeypatch):
+    llm = SlowLLM()
+    monkeypatch.setattr(mailAPI, "llm", llm)
+    serial_draft, serial = timed(serial_run)
+    draft, concurrent = timed(mailAPI.run)
+    print(f"\nserial {serial * 1000:.0f} ms, concurrent {concurrent * 1000:.0f} ms, {llm.calls} LLM calls")
+
+    assert draft == serial_draft
+    assert "priya@x.com" in draft and "Cloud Migration" in draft
+    assert llm.calls == 4
+    assert concurrent < 0.75 * serial
+
+
+def test_session_draft_keeps_addresses_the_summary_dropped(monkeypatch):
+    monkeypatch.setattr(mailAPI, "llm", SlowLLM())
+    session = f"mail-{time.time()}"
+    mailAPI.conversations.append(session, "user", "please copy ops@acme.com on this")
+    mailAPI.conversations.append(session, "assistant", "Will do.")
+    # An older checkpoint whose summary no longer mentions the address.
+    mailAPI.conversations.save_summary(session, "The user asked about ERP.", mailAPI.conversations.last_turn_id(session))
+    mailAPI.conversations.append(session, "user", "and what about AWS?")
+
+    draft = asyncio.run(mailAPI.run_session(session))
+    assert "ops@acme.com" in draft
+
+
+def test_session_draft_keeps_the_event_loop_free(monkeypatch):
+    class SlowStore(type(mailAPI.conversations)):
+        def turns_since(self, session, after_id=0):
+            time.sleep(0.1)
+            return super().turns_since(session, after_id)
+
+        def get_summary(self, session):
+            time.sleep(0.1)
+            return super().get_summary(session)
+
+    store = SlowStore()
+    monkeypatch.setattr(mailAPI, "llm", SlowLLM())
+    monkeypatch.setattr(mailAPI, "conversations", store)
+    monkeypatch.setattr(mailAPI, "summarizer", mailAPI.RollingSummarizer(store, mailAPI.complete_summary))
+    session = f"mail-loop-{time.time()}"
+    store.append(session, "user", "we want to move our ERP to AWS, mail priya@x.com")
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        draft = await mailAPI.run_session(session)
+        task.cancel()
+        return draft, ticks, time.perf_counter() - started
+
+    draft, ticks, elapsed = asyncio.run(scenario())
+    assert "priya@x.com" in draft
+    # Ticks keep coming through the slow reads, not only during the LLM waits.
+    assert ticks >= 0.8 * elapsed / 0.01
@@ -0,0 +1,67 @@
+import time
+import asyncio
+from langchain_core.documents import Document
+from llm_cache import CachingLLM
+from retrieval import Retrieval
+from token_accounting import TokenLedger
+
+LLM_LATENCY = 0.02
+ROUNDS = 10
+CONTEXT = "Argano implements NetSuite, SAP and Oracle ERP and runs cloud migrations to AWS and Azure. " * 20
+
+
+class SlowChatModel:
+    # Stub chat model: fixed latency per call and no usage metadata, so the ledger estimates tokens
+    # from prompt and reply length the same way for every mode.
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        await asyncio.sleep(LLM_LATENCY)
+        if "Rewrite the answer to match your persona" in prompt:
+            reply = "Ha, bold move! Argano implements NetSuite, SAP and Oracle ERP, and even clouds need an upgrade."
+        else:
+            reply = "Argano implements NetSuite, SAP and Oracle ERP and runs cloud migrations to AWS and Azure."
+        return type("Message", (), {"content": reply})()
+
+
+def retrieval_for(query: str) -> Retrieval:
+    doc = Document(page_content=CONTEXT, metadata={"chunk_id": "chunk_erp", "source": "services.pdf"})
+    return Retrieval(query=query, query_embedding=[1.0, 0.0], results=[(doc, 0.4)],
+                     relevance="highly_relevant", top_score=0.4)
+
+
+def run_mode(service, monkeypatch, personality_mode: str, rewrite: bool):
+    token_ledger = TokenLedger()
+    monkeypatch.setattr(service, "llm", CachingLLM(SlowChatModel(), ledger=token_ledger))
+    monkeypatch.setattr(service, "PERSONA_REWRITE", rewrite)
+
+    async def rounds():
+        answers = []
+        for n in range(ROUNDS):
+            query = f"what ERP platforms do you implement? ({n})"
+            answers.append(await service.generate_rag_answer(query, None, retrieval_for(query), personality_mode))
+        return answers
+
+    started = time.perf_counter()
+    answers = asyncio.run(rounds())
+    elapsed = time.perf_counter() - started
+    assert not any(a.get("llm_error") for a in answers)
+    return {**token_ledger.stats()["totals"], "ms_per_answer": elapsed / ROUNDS * 1000}
+
+
+def test_persona_modes_calls_tokens_and_wall_time(chat_service, monkeypatch):
+    results = {
+        "normal": run_mode(chat_service, monkeypatch, "normal", rewrite=False),
+        "witty, persona in prompt": run_mode(chat_service, monkeypatch, "witty", rewrite=False),
+        "witty, PERSONA_REWRITE": run_mode(chat_service, monkeypatch, "witty", rewrite=True),
+    }
+    print(f"\n{'mode':26s} {'calls':>5s} {'prompt':>7s} {'completion':>10s} {'total':>6s} {'ms/answer':>9s}")
+    for mode, r in results.items():
+        print(f"{mode:26s} {r['calls']:5d} {r['prompt_tokens']:7d} {r['completion_tokens']:10d} "
+              f"{r['total_tokens']:6d} {r['ms_per_answer']:9.1f}")
+
+    normal, in_prompt, rewrite = results.values()
+    assert normal["calls"] == in_prompt["calls"] == ROUNDS
+    assert rewrite["calls"] == 2 * ROUNDS
+    assert in_prompt["prompt_tokens"] > normal["prompt_tokens"]
+    assert rewrite["total_tokens"] > in_prompt["total_tokens"]
+    assert rewrite["ms_per_answer"] > 1.5 * in_prompt["ms_per_answer"]
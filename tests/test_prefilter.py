@@ -0,0 +1,53 @@
+import pytest
+from extraction import find_contact, stated_name
+from prefilter import PreClassifier, RulePreClassifier
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("hi", "GREETING_ONLY"),
+    ("hey there!", "GREETING_ONLY"),
+    ("thanks", "ACKNOWLEDGE_ONLY"),
+    ("thank you so much", "ACKNOWLEDGE_ONLY"),
+    ("ok got it", "ACKNOWLEDGE_ONLY"),
+    ("my name is Priya", "GREETING_ONLY"),
+])
+def test_confident_fast_path(text, intent):
+    assert RulePreClassifier().classify(text).intent == intent
+
+
+@pytest.mark.parametrize("text", [
+    "you", "it", "so", "very", "that's",
+    "my name is working",
+    "my name is Bartholomew",
+    "what do you offer?",
+    "hi, can you tell me about aws",
+])
+def test_abstains_when_unsure(text):
+    assert RulePreClassifier().classify(text) is None
+
+
+def test_never_handles_contact_messages():
+    # Contact capture runs before any pre-classifier, so long messages can't skip it.
+    text = "I had a long question about migrating our ERP to the cloud " * 4 + "reach me at bob@x.com"
+    assert len(text) > 200
+    assert find_contact(text) == "bob@x.com"
+    assert RulePreClassifier().classify("bob@x.com") is None
+
+
+def test_stated_name_skips_known_non_names():
+    assert stated_name("call me Sasank, mail sasank@x.com") == "Sasank"
+    assert stated_name("my name is working, mail me at a@b.com") is None
+
+
+def test_counts_hits_and_fallthroughs():
+    classifier = RulePreClassifier()
+    for text in ("hi", "thanks", "what is erp?"):
+        classifier.classify(text)
+    stats = classifier.stats()
+    assert (stats["hits"], stats["llm_fallthrough"]) == (2, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+
+def test_pre_classifier_is_abstract():
+    with pytest.raises(TypeError):
+        PreClassifier()
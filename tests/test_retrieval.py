@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from lexical import LexicalIndex
+from retrieval import (BruteForceRetriever, HybridRetriever, IVFRetriever, VectorSnapshot, export_vectors,
+                       make_retriever)
+from semantic_cache import write_index_version
+
+
+def unit_vectors(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    matrix = np.random.default_rng(seed).normal(size=(n, dim))
+    return (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_float16_matrix_is_searched_without_upcasting():
+    matrix = unit_vectors(200)
+    query = matrix[7] + 0.01
+    exact = BruteForceRetriever(VectorSnapshot([str(i) for i in range(200)], matrix, list(range(200))))
+    half = BruteForceRetriever(VectorSnapshot([str(i) for i in range(200)], matrix.astype(np.float16),
+                                              list(range(200))))
+
+    seen = []
+    matmul = np.ndarray.__matmul__
+
+    class Recording(np.ndarray):
+        def __matmul__(self, other):
+            seen.append(np.result_type(self, other))
+            return matmul(np.asarray(self), other)
+
+    half.snapshot.matrix = half.snapshot.matrix.view(Recording)
+    assert [doc for doc, _ in half.search(query.tolist(), 5)] == [doc for doc, _ in exact.search(query.tolist(), 5)]
+    assert seen == [np.float16]
+
+
+def test_lexical_only_hits_are_scored_from_stored_vectors():
+    matrix = unit_vectors(50)
+    ids = [f"chunk_{i}" for i in range(50)]
+    texts = [f"filler text number {i}" for i in range(50)]
+    texts[42] = "Argano offers NetSuite implementation"
+    docs = [Document(page_content=t, metadata={"chunk_id": i}) for t, i in zip(texts, ids)]
+    vector = BruteForceRetriever(VectorSnapshot(ids, matrix, docs))
+    lexical = LexicalIndex()
+    lexical.add_documents(docs, ids)
+    # Lexical chunk the vector store doesn't have yet: dropped rather than scored as None.
+    lexical.add("chunk_new", "NetSuite migration checklist")
+
+    query = matrix[0]
+    assert "chunk_42" not in {doc.metadata["chunk_id"] for doc, _ in vector.search(query.tolist(), 5)}
+    results = HybridRetriever(vector, lexical, candidates=5).search(query.tolist(), 10, "netsuite")
+    scores = {doc.metadata.get("chunk_id"): score for doc, score in results}
+
+    assert "chunk_42" in scores
+    assert scores["chunk_42"] == pytest.approx(2.0 - 2.0 * float(matrix[42] @ query), abs=1e-5)
+    assert None not in scores.values() and len(results) <= 10
+
+
+class EmptyChroma:
+    # What Chroma's get() returns for a collection with no chunks.
+
+    def get(self, ids=None, include=None):
+        return {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
+
+
+def test_empty_store_exports_and_searches(tmp_path):
+    # A first ingest with no PDFs, or one that removed them all, still writes loadable files.
+    export_vectors(EmptyChroma(), str(tmp_path))
+    snapshot = VectorSnapshot.from_export(str(tmp_path))
+    assert snapshot.ids == [] and len(snapshot.matrix) == 0
+
+    for retriever in (BruteForceRetriever(snapshot), IVFRetriever(VectorSnapshot.from_chroma(EmptyChroma()))):
+        assert retriever.search([0.6, 0.8], 3) == []
+        assert retriever.distances(["chunk_gone"], [0.6, 0.8]) == {}
+    hybrid = HybridRetriever(BruteForceRetriever(snapshot), LexicalIndex())
+    assert hybrid.search([0.6, 0.8], 3, "netsuite") == []
+
+
+class ListChroma:
+    # Just enough of Chroma's get() to export vectors from a list of (chunk_id, text, vector).
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def get(self, ids=None, include=None):
+        chunks = [c for c in self.chunks if ids is None or c[0] in ids]
+        return {"ids": [c[0] for c in chunks], "embeddings": [c[2] for c in chunks],
+                "documents": [c[1] for c in chunks], "metadatas": [{"chunk_id": c[0]} for c in chunks]}
+
+
+def run_ingest(db, persist_dir):
+    # The tail of ingest.build_index: export, save the lexical index, then bump the version.
+    export_vectors(db, persist_dir)
+    lexical = LexicalIndex()
+    for chunk_id, text, _ in db.chunks:
+        lexical.add(chunk_id, text, {"chunk_id": chunk_id})
+    lexical.save(persist_dir)
+    write_index_version(persist_dir)
+
+
+def test_running_retriever_reloads_after_ingest(tmp_path):
+    persist_dir = str(tmp_path)
+    vectors = unit_vectors(3).tolist()
+    db = ListChroma([("chunk_old", "NetSuite pricing sheet", vectors[0]), ("chunk_aws", "AWS migration", vectors[1])])
+    run_ingest(db, persist_dir)
+    retriever = make_retriever(db, "numpy", persist_dir)
+
+    def found(query):
+        return {doc.metadata["chunk_id"] for doc, _ in retriever.search(vectors[1], 3, query)}
+
+    assert "chunk_old" in found("netsuite")
+    serving = retriever.current
+    found("aws")
+    assert retriever.current is serving
+
+    # An ingest run while the worker is up deletes one chunk and adds another.
+    db.chunks = [("chunk_aws", "AWS migration", vectors[1]), ("chunk_new", "NetSuite rollout plan", vectors[2])]
+    run_ingest(db, persist_dir)
+    assert found("netsuite") == {"chunk_aws", "chunk_new"}
+    assert retriever.current is not serving
+    assert retriever.distances(["chunk_old", "chunk_new"], vectors[2]) == {"chunk_new": pytest.approx(0.0, abs=1e-5)}
@@ -0,0 +1,84 @@
+import time
+import numpy as np
+import pytest
+from retrieval import BruteForceRetriever, IVFRetriever, VectorSnapshot, top_k
+
+DIM = 384  # all-MiniLM-L6-v2
+K = 10
+QUERIES = 100
+CORPUS_SIZES = (1_000, 4_000, 16_000)
+
+
+def clustered_corpus(n: int, seed: int = 0):
+    # Unit vectors around a few hundred topics, roughly how chunk embeddings of a document set cluster.
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(max(8, n // 50), DIM))
+    matrix = topics[rng.integers(len(topics), size=n)] + 2.0 * rng.normal(size=(n, DIM))
+    matrix = (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+    queries = topics[rng.integers(len(topics), size=QUERIES)] + 2.0 * rng.normal(size=(QUERIES, DIM))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    snapshot = VectorSnapshot([f"chunk_{i}" for i in range(n)], matrix, list(range(n)))
+    return snapshot, queries
+
+
+def exact_neighbours(matrix: np.ndarray, queries: np.ndarray):
+    return [set(top_k(2.0 - 2.0 * (matrix @ q), K).tolist()) for q in queries]
+
+
+def measure(retriever, queries, truth):
+    latencies, hits = [], 0
+    for q, expected in zip(queries, truth):
+        started = time.perf_counter()
+        results = retriever.search(q.tolist(), K)
+        latencies.append(time.perf_counter() - started)
+        hits += len(expected & {doc for doc, _ in results})
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return p50, p99, hits / (K * len(queries))
+
+
+@pytest.mark.parametrize("n", CORPUS_SIZES)
+def test_search_latency_and_recall(n):
+    snapshot, queries = clustered_corpus(n)
+    truth = exact_neighbours(snapshot.matrix, queries)
+
+    rows = [("numpy", "-") + measure(BruteForceRetriever(snapshot), queries, truth)]
+    ivf = IVFRetriever(snapshot)
+    recalls = []
+    for nprobe in (1, 4, 16, ivf.nlist):
+        ivf.nprobe = nprobe
+        rows.append(("ivf", f"nprobe={nprobe}/{ivf.nlist}") + measure(ivf, queries, truth))
+        recalls.append(rows[-1][-1])
+
+    print(f"\nn={n} k={K} dim={DIM}")
+    print(f"{'backend':8s} {'params':18s} {'p50 ms':>8s} {'p99 ms':>8s} {'recall@k':>9s}")
+    for backend, params, p50, p99, recall in rows:
+        print(f"{backend:8s} {params:18s} {p50:8.3f} {p99:8.3f} {recall:9.3f}")
+
+    assert rows[0][-1] == 1.0
+    assert recalls == sorted(recalls)
+    assert recalls[-1] == 1.0
+
+
+def test_chroma_hnsw_recall():
+    chromadb = pytest.importorskip("chromadb")
+    snapshot, queries = clustered_corpus(4_000)
+    truth = exact_neighbours(snapshot.matrix, queries)
+    client = chromadb.EphemeralClient()
+    print(f"\nn=4000 k={K} dim={DIM}")
+    recalls = []
+    for search_ef in (10, 50, 200):
+        collection = client.create_collection(f"bench_{search_ef}",
+                                              metadata={"hnsw:space": "l2", "hnsw:search_ef": search_ef})
+        for start in range(0, len(snapshot.ids), 1000):
+            collection.add(ids=snapshot.ids[start:start + 1000],
+                           embeddings=snapshot.matrix[start:start + 1000].tolist())
+        latencies, hits = [], 0
+        for q, expected in zip(queries, truth):
+            started = time.perf_counter()
+            ids = collection.query(query_embeddings=[q.tolist()], n_results=K)["ids"][0]
+            latencies.append(time.perf_counter() - started)
+            hits += len(expected & {int(i.split("_")[1]) for i in ids})
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        recalls.append(hits / (K * len(queries)))
+        print(f"chroma   search_ef={search_ef:<8d} {p50:8.3f} {p99:8.3f} {recalls[-1]:9.3f}")
+    assert recalls[-1] > 0.9
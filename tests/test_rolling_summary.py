@@ -0,0 +1,99 @@
+import time
+import asyncio
+from conversation_store import ConversationStore
+from rolling_summary import RollingSummarizer
+
+
+class SlowStore(ConversationStore):
+    # A store whose writes wait on a lock held by another process, as under SQLite contention.
+
+    def append(self, session, role, text):
+        time.sleep(0.2)
+        return super().append(session, role, text)
+
+
+class SlowReadStore(ConversationStore):
+    # Reads that wait on another process's write, as under SQLite contention.
+
+    def last_turn_id(self, session):
+        time.sleep(0.1)
+        return super().last_turn_id(session)
+
+    def get_summary(self, session):
+        time.sleep(0.1)
+        return super().get_summary(session)
+
+    def turns_since(self, session, after_id=0):
+        time.sleep(0.1)
+        return super().turns_since(session, after_id)
+
+
+async def ticking(coro):
+    # Runs coro while counting 10 ms ticks, to show the event loop stayed free.
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        return await coro, ticks
+    finally:
+        task.cancel()
+
+
+async def echo_summary(prompt):
+    return prompt.rsplit("\n\n", 1)[-1]
+
+
+def test_record_turn_does_not_block_the_event_loop(tmp_path):
+    store = SlowStore(str(tmp_path / "conversations.sqlite3"))
+    summarizer = RollingSummarizer(store, echo_summary, min_turns=100)
+
+    async def scenario():
+        started = time.perf_counter()
+        summarizer.record_turn("s1", "hi, mail me at priya@x.com", "Sure!")
+        returned = time.perf_counter() - started
+        await asyncio.gather(*summarizer._tasks)
+        return returned
+
+    assert asyncio.run(scenario()) < 0.05
+    assert [role for _, role, _ in store.turns_since("s1")] == ["user", "assistant"]
+
+
+def test_turns_are_logged_in_order_and_folded(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite3"))
+    summarizer = RollingSummarizer(store, echo_summary, min_turns=4)
+
+    async def scenario():
+        for n in range(3):
+            summarizer.record_turn("s1", f"question {n}", f"answer {n}")
+        await asyncio.gather(*summarizer._tasks)
+
+    asyncio.run(scenario())
+    texts = [text for _, _, text in store.turns_since("s1")]
+    assert texts == ["question 0", "answer 0", "question 1", "answer 1", "question 2", "answer 2"]
+    summary, through_id = store.get_summary("s1")
+    assert through_id == store.last_turn_id("s1")
+    assert "question 2" in summary
+
+
+def test_store_reads_run_off_the_event_loop(tmp_path):
+    store = SlowReadStore(str(tmp_path / "conversations.sqlite3"))
+    store.append("s1", "user", "hi, mail me at priya@x.com")
+    store.save_summary("s1", "Priya said hi.", store.last_turn_id("s1"))
+    store.append("s1", "user", "what about AWS?")
+    summarizer = RollingSummarizer(store, echo_summary)
+
+    async def reads():
+        return (await summarizer.last_turn_id("s1"), await summarizer.checkpoint("s1"),
+                await summarizer.turns("s1"))
+
+    (last_id, (summary, recent), turns), ticks = asyncio.run(ticking(reads()))
+    assert ticks >= 25
+    assert last_id == turns[-1][0]
+    assert (summary, [text for _, _, text in recent]) == ("Priya said hi.", ["what about AWS?"])
+    assert len(turns) == 2
@@ -0,0 +1,166 @@
+import json
+import asyncio
+import pytest
+from retrieval import Retriever
+from router import FALLBACK_ROUTE, route_message
+from session_store import MemorySessionStore
+
+ROUTER_PROMPT_HEAD = "Analyze the user's message"
+
+
+class StubLLM:
+    # Stands in for the chat model: replays canned router replies and records every prompt.
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return type("Message", (), {"content": reply})()
+
+
+def route(llm, text, stored_name=None):
+    return asyncio.run(route_message(llm, text, stored_name))
+
+
+def test_each_turn_makes_exactly_one_classifier_call():
+    turns = [
+        ("hi, my name is sasank", {"name": "sasank", "intent": "GREETING_ONLY", "response_text": "Nice to meet you, Sasank!"}),
+        ("thanks, that's helpful", {"name": None, "intent": "ACKNOWLEDGE_ONLY", "response_text": "Happy to help!"}),
+        ("what cloud services do you offer?", {"name": None, "intent": "QUESTION", "response_text": None}),
+    ]
+    llm = StubLLM(json.dumps(reply) for _, reply in turns)
+    results = []
+    for n, (text, _) in enumerate(turns, start=1):
+        results.append(route(llm, text))
+        assert len(llm.prompts) == n
+        assert text in llm.prompts[-1]
+
+    assert [r.intent for r in results] == ["GREETING_ONLY", "ACKNOWLEDGE_ONLY", "QUESTION"]
+    assert results[0].name == "Sasank"
+    assert results[1].response_text == "Happy to help!"
+    assert results[2].response_text is None
+
+
+def test_code_fenced_reply_is_parsed():
+    reply = '```json\n{"name": "null", "intent": "ACKNOWLEDGE_ONLY", "response_text": "Sure!"}\n```'
+    result = route(StubLLM([reply]), "ok")
+    assert (result.name, result.intent, result.response_text) == (None, "ACKNOWLEDGE_ONLY", "Sure!")
+
+
+def test_unparseable_reply_falls_back_to_question():
+    # Contact details are only detected locally, so CONTACT_INFO is as unknown as any made-up intent.
+    llm = StubLLM(["I think this is a greeting", json.dumps({"intent": "SMALL_TALK"}),
+                   json.dumps({"name": None, "intent": "CONTACT_INFO", "response_text": "Got it"})])
+    assert route(llm, "hello") == FALLBACK_ROUTE
+    assert route(llm, "hello") == FALLBACK_ROUTE
+    assert route(llm, "reach me at bob@x.com") == FALLBACK_ROUTE
+    assert len(llm.prompts) == 3
+
+
+def test_llm_failure_falls_back_without_retrying():
+    llm = StubLLM([RuntimeError("quota exceeded")])
+    assert route(llm, "hello") == FALLBACK_ROUTE
+    assert len(llm.prompts) == 1
+
+
+def test_canned_intent_without_reply_goes_to_rag():
+    llm = StubLLM([json.dumps({"name": "Priya", "intent": "GREETING_ONLY", "response_text": ""})])
+    result = route(llm, "hi I'm priya")
+    assert (result.name, result.intent) == ("Priya", "QUESTION")
+
+
+class ScriptedChatModel:
+    # Stands in for the chat model behind a whole /ask turn: answers router prompts from a script
+    # keyed by user text and records every prompt it is sent, router or not.
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.prompts = []
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        reply = "Here is what we offer."
+        if prompt.startswith(ROUTER_PROMPT_HEAD):
+            text = prompt.split('User Input: "', 1)[1].split('"\n', 1)[0]
+            reply = json.dumps(self.routes[text])
+        return type("Message", (), {"content": reply})()
+
+
+class CountingSessions(MemorySessionStore):
+    def __init__(self):
+        super().__init__()
+        self.reads = self.writes = 0
+
+    def get(self, key):
+        self.reads += 1
+        return super().get(key)
+
+    def update(self, key, **fields):
+        self.writes += 1
+        return super().update(key, **fields)
+
+
+class NoMatches(Retriever):
+    def search(self, query_embedding, k, query=""):
+        return []
+
+    def distances(self, ids, query_embedding):
+        return {}
+
+
+class StubEmbeddings:
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+@pytest.fixture
+def turn_service(chat_service, monkeypatch):
+    monkeypatch.setattr(chat_service, "sessions", CountingSessions())
+    monkeypatch.setattr(chat_service, "retriever", NoMatches())
+    monkeypatch.setattr(chat_service, "embeddings", StubEmbeddings())
+    monkeypatch.setattr(chat_service, "semantic_cache", None)
+    monkeypatch.setattr(chat_service, "PERSONA_REWRITE", False)
+    return chat_service
+
+
+@pytest.mark.parametrize("personality_mode", ["normal", "witty"])
+def test_route_turn_makes_at_most_one_classifier_call(turn_service, monkeypatch, personality_mode):
+    turns = [
+        # (user text, router reply when the pre-classifier should miss, router calls expected)
+        ("hi", None, 0),
+        ("thanks a lot!", None, 0),
+        ("hi I'm Bartholomew, nice to meet you",
+         {"name": "Bartholomew", "intent": "GREETING_ONLY", "response_text": "Nice to meet you, Bartholomew!"}, 1),
+        ("what cloud services do you offer?", {"name": None, "intent": "QUESTION", "response_text": None}, 1),
+        ("cool, thanks", {"name": None, "intent": "ACKNOWLEDGE_ONLY", "response_text": "Happy to help!"}, 0),
+        ("you can mail me at bart@x.com if you have a brochure", None, 0),
+    ]
+    llm = ScriptedChatModel({text: reply for text, reply, _ in turns if reply})
+    monkeypatch.setattr(turn_service, "llm", llm)
+
+    async def conversation():
+        sessions = turn_service.sessions
+        for text, _, expected in turns:
+            before = len(llm.prompts)
+            reads, writes = sessions.reads, sessions.writes
+            response, _, _ = await turn_service.route_turn(text, "client-1", personality_mode)
+            sent = llm.prompts[before:]
+            # The session record is read once and handed on, whatever path the turn takes.
+            assert (sessions.reads - reads, sessions.writes - writes) in ((1, 0), (1, 1), (0, 1)), text
+            assert len([p for p in sent if p.startswith(ROUTER_PROMPT_HEAD)]) == expected, text
+            if expected or personality_mode == "normal":
+                # Persona styling rides along in the router prompt, so nothing else is called.
+                assert len(sent) == expected, text
+            if expected:
+                assert text in sent[0]
+                assert ("witty" in personality_mode) == ("Persona (VERY IMPORTANT" in sent[0])
+            assert response is not None
+
+    asyncio.run(conversation())
+    record = turn_service.sessions.get("client-1")
+    assert (record.name, record.contact) == ("Bartholomew", "bart@x.com")
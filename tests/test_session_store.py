@@ -0,0 +1,119 @@
+import time
+import asyncio
+import sqlite3
+import threading
+import tracemalloc
+import pytest
+from session_store import MemorySessionStore, SQLiteSessionStore, SessionStore
+
+
+def test_memory_store_soak_stays_bounded():
+    # One fresh session per request for a long uptime: memory must plateau at max_entries.
+    store = MemorySessionStore(max_entries=1000, ttl_seconds=3600)
+    tracemalloc.start()
+    try:
+        for i in range(20_000):
+            store.update(f"session-{i}", name="Priya", contact=f"user{i}@x.com")
+        plateau = tracemalloc.get_traced_memory()[0]
+        for i in range(20_000, 200_000):
+            store.update(f"session-{i}", name="Priya", contact=f"user{i}@x.com")
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    assert len(store) == 1000
+    assert after - plateau < 256 * 1024
+    assert store.get("session-0").name is None
+    assert store.get("session-199999").contact == "user199999@x.com"
+
+
+def test_memory_store_expires_idle_sessions():
+    store = MemorySessionStore(ttl_seconds=0.05)
+    store.update("a", name="Sam")
+    time.sleep(0.1)
+    assert store.get("a").name is None
+    assert store.update("a", contact="sam@x.com").name is None
+
+
+def test_sqlite_store_soak_stays_bounded(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), max_entries=200)
+    for i in range(5_000):
+        store.update(f"session-{i}", name="Priya")
+    assert len(store) < 200 + 100
+
+
+def test_sqlite_concurrent_field_updates_are_not_lost(tmp_path):
+    # Two workers with their own connections: one records the name, the other the contact.
+    path = str(tmp_path / "sessions.sqlite3")
+    names, contacts = SQLiteSessionStore(path), SQLiteSessionStore(path)
+
+    def set_names():
+        for i in range(300):
+            names.update(f"session-{i}", name=f"Name{i}")
+
+    def set_contacts():
+        for i in range(300):
+            contacts.update(f"session-{i}", contact=f"user{i}@x.com")
+
+    threads = [threading.Thread(target=set_names), threading.Thread(target=set_contacts)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for i in range(300):
+        record = names.get(f"session-{i}")
+        assert (record.name, record.contact) == (f"Name{i}", f"user{i}@x.com")
+
+
+def test_sqlite_update_resets_expired_fields(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), ttl_seconds=0.05)
+    store.update("a", name="Sam", contact="sam@x.com")
+    assert store.update("a", name="Samuel").contact == "sam@x.com"
+    time.sleep(0.1)
+    record = store.update("a", name="Sam")
+    assert (record.name, record.contact) == ("Sam", None)
+
+
+def test_sqlite_rejects_unknown_fields(tmp_path):
+    with pytest.raises(ValueError):
+        SQLiteSessionStore(str(tmp_path / "sessions.sqlite3")).update("a", mood="happy")
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_sqlite_async_calls_do_not_block_the_event_loop(tmp_path):
+    # Another worker holds the write lock; the handler's update must wait off the event loop.
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SQLiteSessionStore(path)
+    other = sqlite3.connect(path, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, other.rollback).start()
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        record = await store.aupdate("a", name="Sam", contact="sam@x.com")
+        read = await store.aget("a")
+        task.cancel()
+        return ticks, record, read
+
+    ticks, record, read = asyncio.run(scenario())
+    assert ticks >= 15
+    assert (record.name, read.name, read.contact) == ("Sam", "Sam", "sam@x.com")
+
+
+def test_memory_store_async_calls_share_the_sync_records():
+    store = MemorySessionStore()
+    record = asyncio.run(store.aupdate("a", name="Sam"))
+    assert store.get("a") is record and asyncio.run(store.aget("a")).name == "Sam"
@@ -0,0 +1,143 @@
+import os
+import math
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+TOKEN_LEDGER_MAX_SESSIONS = int(os.getenv("TOKEN_LEDGER_MAX_SESSIONS", "10000"))
+
+# Labels for the request currently being served; each request runs in its own task, so values set
+# in one handler never leak into another.
+token_labels: contextvars.ContextVar = contextvars.ContextVar("token_labels", default={})
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return math.ceil(len(text) / 4)
+
+
+@dataclass
+class TokenUsage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    exact: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def _field(obj: Any, name: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def response_text(response: Any) -> str:
+    if isinstance(response, str):
+        return response
+    return _field(response, "content") or _field(response, "text") or ""
+
+
+def usage_from_response(response: Any) -> Optional[TokenUsage]:
+    # LangChain messages carry usage_metadata (or the provider's token_usage in response_metadata);
+    # LlamaIndex responses keep the Gemini usage_metadata on .raw.
+    meta = _field(response, "usage_metadata")
+    if meta and _field(meta, "input_tokens") is not None:
+        return TokenUsage(_field(meta, "input_tokens") or 0, _field(meta, "output_tokens") or 0, True)
+
+    usage = _field(_field(response, "response_metadata"), "token_usage")
+    if usage and _field(usage, "prompt_tokens") is not None:
+        return TokenUsage(_field(usage, "prompt_tokens") or 0, _field(usage, "completion_tokens") or 0, True)
+
+    meta = _field(_field(response, "raw"), "usage_metadata")
+    if meta and _field(meta, "prompt_token_count") is not None:
+        return TokenUsage(_field(meta, "prompt_token_count") or 0, _field(meta, "candidates_token_count") or 0, True)
+    return None
+
+
+def account(response: Any, prompt: Any, text: Optional[str] = None) -> TokenUsage:
+    usage = usage_from_response(response)
+    if usage is not None:
+        return usage
+    return TokenUsage(estimate_tokens(str(prompt)),
+                      estimate_tokens(text if text is not None else response_text(response)))
+
+
+def set_token_labels(**labels):
+    token_labels.set({**token_labels.get(), **labels})
+
+
+@contextmanager
+def token_scope(**labels):
+    reset = token_labels.set({**token_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        token_labels.reset(reset)
+
+
+class TokenLedger:
+    # Running token totals overall and per agent, endpoint and session (sessions bounded LRU).
+
+    def __init__(self, max_sessions: int = TOKEN_LEDGER_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.totals = self._empty()
+        self.by_agent: Dict[str, Dict[str, int]] = {}
+        self.by_endpoint: Dict[str, Dict[str, int]] = {}
+        self.by_session: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _empty() -> Dict[str, int]:
+        return {"calls": 0, "estimated_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+    @staticmethod
+    def _add(counters: Dict[str, int], usage: TokenUsage):
+        counters["calls"] += 1
+        counters["estimated_calls"] += 0 if usage.exact else 1
+        counters["prompt_tokens"] += usage.prompt_tokens
+        counters["completion_tokens"] += usage.completion_tokens
+        counters["total_tokens"] += usage.total_tokens
+
+    def record(self, usage: TokenUsage, session: Optional[str] = None, agent: Optional[str] = None,
+               endpoint: Optional[str] = None):
+        labels = token_labels.get()
+        session = session or labels.get("session")
+        agent = agent or labels.get("agent") or "unlabelled"
+        endpoint = endpoint or labels.get("endpoint") or "unlabelled"
+        with self._lock:
+            self._add(self.totals, usage)
+            self._add(self.by_agent.setdefault(agent, self._empty()), usage)
+            self._add(self.by_endpoint.setdefault(endpoint, self._empty()), usage)
+            if session:
+                counters = self.by_session.get(session)
+                if counters is None:
+                    counters = self.by_session[session] = self._empty()
+                self.by_session.move_to_end(session)
+                self._add(counters, usage)
+                while len(self.by_session) > self.max_sessions:
+                    self.by_session.popitem(last=False)
+
+    def session_stats(self, session: str) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.by_session.get(session) or self._empty())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "totals": dict(self.totals),
+                "by_agent": {k: dict(v) for k, v in self.by_agent.items()},
+                "by_endpoint": {k: dict(v) for k, v in self.by_endpoint.items()},
+                "sessions": len(self.by_session),
+            }
+
+
+ledger = TokenLedger()